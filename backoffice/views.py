@@ -1,16 +1,16 @@
-import requests as http_requests
-
-from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.core.paginator import Paginator
+from django.db import transaction
 from django.db.models import Count, Q
 from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
 
 from account.models import TelegramUser
+from bot.models import OutboxMessage
+from bot.outbox import enqueue_message
 from bonus.models import BonusMessage
 from catalog.models import Product, Task
 from payouts.models import Payout
@@ -23,6 +23,25 @@ from .forms import (
 )
 
 
+def send_bonus_message(user, text: str) -> BonusMessage:
+    """Сообщение менеджера в бонус-чат: запись и постановка в outbox одной транзакцией"""
+    with transaction.atomic():
+        message = BonusMessage.objects.create(
+            user=user,
+            sender_type=BonusMessage.SenderType.MANAGER,
+            text=text,
+            is_read=True,
+        )
+        enqueue_message(
+            user.telegram_id,
+            text,
+            bot=OutboxMessage.Bot.BONUS,
+            parse_mode=None,
+            bonus_message=message,
+        )
+    return message
+
+
 class StaffRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
     login_url = '/backoffice/login/'
 
@@ -255,9 +274,8 @@ class BuybackDetailView(StaffRequiredMixin, View):
         form = BuybackActionForm(request.POST)
         if form.is_valid():
             action = form.cleaned_data['action']
-            if action == 'approve' and buyback.status == Buyback.Status.PENDING_REVIEW:
-                buyback.status = Buyback.Status.APPROVED
-                buyback.save(update_fields=['status'])
+            if action == 'approve':
+                buyback.approve()
             elif action == 'reject':
                 reason = form.cleaned_data.get('rejection_reason', '')
                 buyback.reject(reason)
@@ -361,9 +379,8 @@ class BuybackModerationDetailView(StaffRequiredMixin, View):
         form = BuybackActionForm(request.POST)
         if form.is_valid():
             action = form.cleaned_data['action']
-            if action == 'approve' and buyback.status == Buyback.Status.PENDING_REVIEW:
-                buyback.status = Buyback.Status.APPROVED
-                buyback.save(update_fields=['status'])
+            if action == 'approve':
+                buyback.approve()
             elif action == 'reject':
                 reason = form.cleaned_data.get('rejection_reason', '')
                 buyback.reject(reason)
@@ -605,34 +622,7 @@ class BonusChatView(StaffRequiredMixin, View):
             messages.error(request, 'Сообщение не может быть пустым')
             return redirect('backoffice:bonus_chat', pk=pk)
 
-        telegram_message_id = None
-        try:
-            resp = http_requests.post(
-                f'https://api.telegram.org/bot{settings.BONUS_BOT_TOKEN}/sendMessage',
-                json={
-                    'chat_id': user.telegram_id,
-                    'text': text,
-                },
-                timeout=10,
-            )
-            data = resp.json()
-            if data.get('ok'):
-                telegram_message_id = data['result']['message_id']
-            else:
-                messages.warning(
-                    request,
-                    f'Telegram API: {data.get("description", "Unknown error")}'
-                )
-        except http_requests.RequestException as e:
-            messages.warning(request, f'Ошибка отправки: {e}')
-
-        BonusMessage.objects.create(
-            user=user,
-            sender_type=BonusMessage.SenderType.MANAGER,
-            text=text,
-            is_read=True,
-            telegram_message_id=telegram_message_id,
-        )
+        send_bonus_message(user, text)
 
         return redirect('backoffice:bonus_chat', pk=pk)
 
@@ -645,34 +635,7 @@ class BonusChatSendView(StaffRequiredMixin, View):
             messages.error(request, 'Сообщение не может быть пустым')
             return redirect('backoffice:user_detail', pk=pk)
 
-        telegram_message_id = None
-        try:
-            resp = http_requests.post(
-                f'https://api.telegram.org/bot{settings.BONUS_BOT_TOKEN}/sendMessage',
-                json={
-                    'chat_id': user.telegram_id,
-                    'text': text,
-                },
-                timeout=10,
-            )
-            data = resp.json()
-            if data.get('ok'):
-                telegram_message_id = data['result']['message_id']
-            else:
-                messages.warning(
-                    request,
-                    f'Telegram API: {data.get("description", "Unknown error")}'
-                )
-        except http_requests.RequestException as e:
-            messages.warning(request, f'Ошибка отправки: {e}')
-
-        BonusMessage.objects.create(
-            user=user,
-            sender_type=BonusMessage.SenderType.MANAGER,
-            text=text,
-            is_read=True,
-            telegram_message_id=telegram_message_id,
-        )
+        send_bonus_message(user, text)
 
         return redirect('backoffice:user_detail', pk=pk)
 
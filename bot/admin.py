@@ -1,3 +1,11 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import OutboxMessage
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ['id', 'bot', 'chat_id', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status', 'bot', 'created_at']
+    search_fields = ['chat_id']
+    readonly_fields = ['telegram_message_id', 'created_at', 'sent_at', 'last_error']
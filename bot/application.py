@@ -0,0 +1,146 @@
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from telegram.ext import Application, ContextTypes
+
+from bot.catalog_cache import catalog_cache
+from bot.concurrency import AdmissionQueue, PerUserUpdateProcessor
+from bot.digest import reminder_digest
+from bot.handlers import register_handlers
+from bot.identity import BotContext, identity_cache
+from bot.metrics import metrics
+from bot import outbox_worker
+from bot.outbox import prune_sent_messages
+from bot.persistence import DjangoPersistence
+from bot.photos import photo_ingestor
+from bot.rate_limiter import TelegramRateLimiter
+from bot.reminders import check_reminders_job, check_timeouts_job, check_step_reminders_job, prune_reminders_job
+from bot import scheduler
+from bot.scheduler import DeadlineKind, start_scheduler, stop_scheduler
+from bot.step_plan import step_plans
+from pipeline.counter_service import reconcile_completed, reconcile_reserved
+
+logger = logging.getLogger(__name__)
+
+
+def build_application() -> Application:
+    """Собрать Application бота (общая сборка для polling и webhook)"""
+    application = (
+        Application.builder()
+        .token(settings.BOT_TOKEN)
+        .context_types(ContextTypes(context=BotContext))
+        .persistence(DjangoPersistence(update_interval=settings.BOT_PERSISTENCE_INTERVAL))
+        .update_queue(AdmissionQueue(maxsize=settings.BOT_UPDATE_QUEUE_SIZE))
+        .concurrent_updates(PerUserUpdateProcessor(
+            max_running=settings.BOT_CONCURRENT_UPDATES,
+            max_pending=settings.BOT_UPDATE_QUEUE_SIZE,
+        ))
+        .rate_limiter(TelegramRateLimiter(
+            global_rate=settings.BOT_RATE_LIMIT_GLOBAL,
+            per_chat_rate=settings.BOT_RATE_LIMIT_PER_CHAT,
+            max_concurrency=settings.BOT_RATE_LIMIT_CONCURRENCY,
+            max_retries=settings.BOT_RATE_LIMIT_MAX_RETRIES,
+        ))
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .build()
+    )
+    register_handlers(application)
+    return application
+
+
+async def post_init(application: Application):
+    """Запуск планировщика дедлайнов (напоминания, таймауты, напоминания по шагам)"""
+    await start_scheduler(
+        application,
+        jobs={
+            DeadlineKind.REMINDER: check_reminders_job,
+            DeadlineKind.TIMEOUT: check_timeouts_job,
+            DeadlineKind.STEP_REMINDER: check_step_reminders_job,
+        },
+        resync_interval=settings.BOT_SCHEDULER_RESYNC_INTERVAL,
+        catchup_interval=settings.BOT_SCHEDULER_CATCHUP_INTERVAL,
+    )
+    await outbox_worker.start_outbox_worker(
+        application,
+        batch_size=settings.BOT_OUTBOX_BATCH_SIZE,
+        lease_seconds=settings.BOT_OUTBOX_LEASE_SECONDS,
+        poll_interval=settings.BOT_OUTBOX_POLL_INTERVAL,
+        max_attempts=settings.BOT_OUTBOX_MAX_ATTEMPTS,
+    )
+    register_jobs(application)
+
+
+def register_jobs(application: Application):
+    """Периодическое обслуживание (не привязано к дедлайнам)"""
+    application.job_queue.run_repeating(
+        prune_reminders_job,
+        interval=settings.BOT_REMINDER_PRUNE_INTERVAL,
+        first=60,
+    )
+    application.job_queue.run_repeating(
+        prune_outbox_job,
+        interval=settings.BOT_REMINDER_PRUNE_INTERVAL,
+        first=120,
+    )
+    application.job_queue.run_repeating(
+        reconcile_counters_job,
+        interval=settings.BOT_COUNTER_RECONCILE_INTERVAL,
+        first=180,
+    )
+    application.job_queue.run_repeating(
+        log_metrics_job,
+        interval=settings.BOT_METRICS_LOG_INTERVAL,
+        first=settings.BOT_METRICS_LOG_INTERVAL,
+    )
+
+
+async def log_metrics_job(context: ContextTypes.DEFAULT_TYPE):
+    """Сводка метрик задач, отправок, очереди апдейтов и кэшей в лог"""
+    application = context.application
+    extra = {
+        'updates': {
+            **application.update_processor.stats(),
+            'in_flight': application.update_queue.in_flight,
+        },
+        'rate_limiter': application.bot.rate_limiter.stats(),
+        'catalog_cache': catalog_cache.stats(),
+        'step_plans': step_plans.stats(),
+        'identity_cache': identity_cache.stats(),
+        'reminder_digest': reminder_digest.stats(),
+        'photos': photo_ingestor.stats(),
+    }
+    if scheduler.scheduler is not None:
+        extra['scheduler'] = scheduler.scheduler.stats()
+    if outbox_worker.worker is not None:
+        extra['outbox'] = outbox_worker.worker.stats()
+    metrics.log_summary(extra)
+
+
+async def prune_outbox_job(context: ContextTypes.DEFAULT_TYPE):
+    """Очистка отправленных сообщений outbox"""
+    await sync_to_async(prune_sent_messages)(settings.OUTBOX_RETENTION_DAYS, settings.REMINDER_PRUNE_CHUNK_SIZE)
+
+
+def reconcile_counters():
+    chunk_size = settings.COUNTER_RECONCILE_CHUNK_SIZE
+    return reconcile_reserved(chunk_size=chunk_size), reconcile_completed(chunk_size=chunk_size)
+
+
+async def reconcile_counters_job(context: ContextTypes.DEFAULT_TYPE):
+    """Сверка счётчиков товаров и пользователей с выкупами; расхождения — в лог"""
+    reserved, completed = await sync_to_async(reconcile_counters)()
+    drift = {'reserved': reserved, **completed}
+    for name, rows in drift.items():
+        if rows:
+            logger.warning(
+                'Счётчики разошлись (%s): исправлено %d, например %s',
+                name, len(rows), dict(list(rows.items())[:10]),
+            )
+
+
+async def post_stop(application: Application):
+    await photo_ingestor.drain()
+    await outbox_worker.stop_outbox_worker()
+    await stop_scheduler()
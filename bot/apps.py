@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class BotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bot'
-    verbose_name = 'Telegram бот'
\ No newline at end of file
+    verbose_name = 'Telegram бот'
+
+    def ready(self):
+        import bot.signals  # noqa
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import time
+
+from django.conf import settings
+
+from catalog.models import Task
+from catalog.services import catalog_queryset
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogCache:
+    """Каталог активных заданий в памяти процесса бота.
+
+    Записи живут ttl секунд и сбрасываются сигналами при изменении
+    Task/Product/TaskStep и переходах выкупов в этом процессе.
+    Правки из бэкофиса (другой процесс) подхватываются по истечении TTL.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._tasks: dict[int, Task] | None = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return self._tasks is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    async def _aget_tasks(self) -> dict[int, Task]:
+        if self._is_fresh():
+            self.hits += 1
+            return self._tasks
+
+        async with self._lock:
+            if self._is_fresh():
+                self.hits += 1
+                return self._tasks
+
+            self.misses += 1
+            generation = self._generation
+            queryset = catalog_queryset().filter(is_active=True, product__is_active=True)
+            tasks = {task.id: task async for task in queryset}
+
+            # Пока грузили, каталог могли изменить — тогда не кэшируем
+            if generation == self._generation:
+                self._tasks = tasks
+                self._loaded_at = time.monotonic()
+                logger.debug('Каталог загружен в кэш: %s заданий', len(tasks))
+            return tasks
+
+    async def aget_available_tasks(self) -> list[Task]:
+        """Активные задания с остатком, в порядке каталога"""
+        tasks = await self._aget_tasks()
+        return [task for task in tasks.values() if task.available > 0]
+
+    async def aget_task(self, task_id: int) -> Task | None:
+        """Карточка задания; неактивные задания читаются из БД"""
+        tasks = await self._aget_tasks()
+        task = tasks.get(task_id)
+        if task is None:
+            task = await catalog_queryset().filter(id=task_id).afirst()
+        return task
+
+    def invalidate(self):
+        """Сбросить кэш (вызывается из сигналов)"""
+        self._generation += 1
+        self._tasks = None
+
+    def stats(self) -> dict:
+        """Счётчики попаданий для мониторинга"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._tasks) if self._tasks is not None else 0,
+        }
+
+
+catalog_cache = CatalogCache(ttl=settings.BOT_CATALOG_CACHE_TTL)
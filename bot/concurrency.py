@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class AdmissionQueue(asyncio.Queue):
+    """Очередь апдейтов, у которой maxsize ограничивает принятую работу.
+
+    Обычная очередь PTB пустеет сразу: Application забирает каждый апдейт
+    и создаёт под него задачу. task_done же Application вызывает только
+    после обработки апдейта, поэтому «заполненность» считаем по
+    незавершённым апдейтам (в очереди + в обработке): webhook получает
+    QueueFull и отвечает 503, polling ждёт в put(), пока что-то
+    не обработается.
+    """
+
+    def full(self) -> bool:
+        return 0 < self.maxsize <= self._unfinished_tasks
+
+    def task_done(self):
+        super().task_done()
+        # Место освобождается здесь, а не в get() — будим ждущий put()
+        self._wakeup_next(self._putters)
+
+    @property
+    def in_flight(self) -> int:
+        return self._unfinished_tasks
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка апдейтов разных пользователей.
+
+    Апдейты одного telegram_id выполняются строго по очереди (ConversationHandler
+    и user_data рассчитаны на последовательную обработку), одновременно
+    обрабатывается не больше max_running апдейтов. Ведёт статистику
+    ожидания перед обработкой.
+
+    Всё реализовано в do_process_update (process_update в PTB помечен @final).
+    Число принятых апдейтов (max_pending) ограничивает AdmissionQueue,
+    семафор PTB рассчитан на тот же предел и сам не ждёт. Предел обработки —
+    свой семафор, который берётся уже после замка пользователя, чтобы
+    апдейты одного пользователя не занимали слоты, ожидая друг друга.
+    """
+
+    def __init__(self, max_running: int, max_pending: int):
+        super().__init__(max(max_running, max_pending))
+        self.max_running = max_running
+        self._running: asyncio.Semaphore | None = None
+        self._locks: dict[int, asyncio.Lock] = {}
+        self._lock_users: dict[int, int] = {}
+        self.processed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def do_process_update(self, update: object, coroutine):
+        started = time.monotonic()
+        key = _update_key(update)
+
+        if key is None:
+            async with self._running:
+                self._record_wait(started)
+                await coroutine
+            return
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        try:
+            async with lock, self._running:
+                self._record_wait(started)
+                await coroutine
+        finally:
+            self._lock_users[key] -= 1
+            if not self._lock_users[key]:
+                del self._lock_users[key]
+                del self._locks[key]
+
+    def _record_wait(self, started: float):
+        wait = time.monotonic() - started
+        self.processed += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+    async def initialize(self):
+        self._running = asyncio.Semaphore(self.max_running)
+
+    async def shutdown(self):
+        pass
+
+    def stats(self) -> dict:
+        """Ожидание апдейта в очереди на обработку (секунды)"""
+        return {
+            'processed': self.processed,
+            'in_flight_users': len(self._locks),
+            'wait_avg': self.wait_total / self.processed if self.processed else 0.0,
+            'wait_max': self.wait_max,
+        }
+
+
+def _update_key(update: object) -> int | None:
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user:
+        return update.effective_user.id
+    if update.effective_chat:
+        return update.effective_chat.id
+    return None
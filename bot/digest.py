@@ -0,0 +1,84 @@
+import asyncio
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Лимит длины сообщения Telegram
+MESSAGE_LIMIT = 4096
+SEPARATOR = '\n\n➖➖➖\n\n'
+
+
+class ReminderDigest:
+    """Склейка напоминаний одному чату в одно сообщение.
+
+    Первое напоминание открывает окно в window секунд; всё, что придёт
+    в этот чат за окно (из любой задачи планировщика), уходит одним
+    сообщением. send() возвращает результат отправки общего сообщения.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._pending: dict[int, list[tuple[str, asyncio.Future]]] = {}
+        self.messages = 0
+        self.merged = 0
+
+    async def send(self, bot, chat_id: int, text: str) -> bool:
+        if self.window <= 0:
+            return await self._send(bot, chat_id, [text])
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.get(chat_id)
+        if batch is None:
+            batch = self._pending[chat_id] = []
+            loop.create_task(self._flush_later(bot, chat_id))
+        batch.append((text, future))
+        return await future
+
+    async def _flush_later(self, bot, chat_id: int):
+        await asyncio.sleep(self.window)
+        batch = self._pending.pop(chat_id)
+        ok = await self._send(bot, chat_id, [text for text, _ in batch])
+        for _, future in batch:
+            if not future.done():
+                future.set_result(ok)
+
+    async def _send(self, bot, chat_id: int, texts: list[str]) -> bool:
+        ok = True
+        for message in _pack(texts):
+            try:
+                await bot.send_message(chat_id=chat_id, text=message, parse_mode='HTML')
+                self.messages += 1
+            except Exception:
+                logger.exception('Не удалось отправить напоминания (chat=%s)', chat_id)
+                ok = False
+        self.merged += len(texts)
+        return ok
+
+    def stats(self) -> dict:
+        return {
+            'reminders': self.merged,
+            'messages': self.messages,
+            'pending_chats': len(self._pending),
+        }
+
+
+def _pack(texts: list[str]) -> list[str]:
+    """Склеить тексты в сообщения, не превышающие лимит Telegram"""
+    messages = []
+    current = ''
+    for text in texts:
+        candidate = f'{current}{SEPARATOR}{text}' if current else text
+        if current and len(candidate) > MESSAGE_LIMIT:
+            messages.append(current)
+            current = text
+        else:
+            current = candidate
+    if current:
+        messages.append(current)
+    return messages
+
+
+reminder_digest = ReminderDigest(settings.BOT_REMINDER_DIGEST_WINDOW)
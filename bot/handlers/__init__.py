@@ -1,11 +1,15 @@
+from telegram import Update
 from telegram.ext import (
     CommandHandler,
     CallbackQueryHandler,
     MessageHandler,
     ConversationHandler,
+    TypeHandler,
     filters,
 )
 
+from bot.identity import identity_middleware
+
 from .start import start_handler, onboarding_callback
 from .menu import profile_handler, support_handler
 from .tasks import tasks_list_handler, task_detail_callback, tasks_list_callback
@@ -24,6 +28,9 @@ from .flow import (
 def register_handlers(application):
     """Регистрация обработчиков"""
 
+    # Резолвим пользователя и активный выкуп до остальных обработчиков
+    application.add_handler(TypeHandler(Update, identity_middleware), group=-1)
+
     # ConversationHandler для прохождения выкупа
     flow_handler = ConversationHandler(
         entry_points=[
@@ -45,6 +52,8 @@ def register_handlers(application):
         ],
         per_user=True,
         per_chat=True,
+        name='buyback_flow',
+        persistent=True,
     )
 
     application.add_handler(flow_handler)
@@ -1,17 +1,17 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 
-from account.models import TelegramUser
 from pipeline.models import Buyback
+from bot.identity import aget_identity
 
 
 async def my_buybacks_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Мои выкупы"""
-    try:
-        user = await TelegramUser.objects.aget(telegram_id=update.effective_user.id)
-    except TelegramUser.DoesNotExist:
+    identity = await aget_identity(update, context)
+    if not identity:
         await update.message.reply_text('⚠️ Нажми /start')
         return
+    user = identity.user
 
     buybacks = []
     async for bb in Buyback.objects.filter(user=user).select_related('task').order_by('-started_at')[:10]:
@@ -1,21 +1,25 @@
+import asyncio
 import logging
-import os
 
+from asgiref.sync import sync_to_async
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.error import BadRequest
 from telegram.ext import ContextTypes, ConversationHandler
-from django.conf import settings
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
-from bot.reminders import schedule_publish_review_reminders, cancel_buyback_reminders
+from bot.reminders import schedule_publish_review_reminders, cancel_buyback_reminders, expire_buybacks
+from bot.step_plan import CompiledStep, step_plans
+from bot.identity import aget_identity
+from bot.photos import photo_ingestor
+from bot.scheduler import schedule_step_deadlines
 from account.models import TelegramUser
 from catalog.models import Task
 from steps.models import TaskStep, StepType
 from steps.validators import get_validator
 from pipeline.models import Buyback, BuybackResponse
-from pipeline.services import format_step_message
+from pipeline.services import format_step_message, submit_response
 from bot.keyboards.reply import main_menu_keyboard
 
 
@@ -35,28 +39,21 @@ async def safe_edit_message(query, text, parse_mode=None):
             pass
 
 
-async def resume_buyback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Возобновить активный выкуп (entry point)"""
-    try:
-        user = await TelegramUser.objects.aget(telegram_id=update.effective_user.id)
-    except TelegramUser.DoesNotExist:
-        return None
+async def get_buyback_task(buyback: Buyback) -> Task:
+    """Задание выкупа — без запроса, если оно уже загружено"""
+    if Buyback.task.is_cached(buyback):
+        return buyback.task
+    return await Task.objects.aget(id=buyback.task_id)
 
-    buyback = await Buyback.objects.filter(
-        user=user,
-        status=Buyback.Status.IN_PROGRESS,
-    ).select_related('task').order_by('-started_at').afirst()
 
-    if not buyback:
+async def resume_buyback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Возобновить активный выкуп (entry point)"""
+    identity = await aget_identity(update, context, with_buyback=True)
+    if not identity or not identity.buyback or not identity.step:
         return None
 
-    step = await TaskStep.objects.filter(
-        task_id=buyback.task_id,
-        order=buyback.current_step,
-    ).afirst()
-
-    if not step:
-        return None
+    buyback = identity.buyback
+    step = identity.step
 
     context.user_data['buyback_id'] = buyback.id
     context.user_data['step_id'] = step.id
@@ -72,13 +69,17 @@ async def take_task_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     task_id = int(query.data.split(':')[1])
 
+    identity = await aget_identity(update, context)
     try:
-        user = await TelegramUser.objects.aget(telegram_id=update.effective_user.id)
         task = await Task.objects.select_related('product').aget(id=task_id, is_active=True)
-    except (TelegramUser.DoesNotExist, Task.DoesNotExist):
+    except Task.DoesNotExist:
+        task = None
+
+    if not identity or not task:
         await query.edit_message_text('⚠️ Ошибка. Попробуй снова.')
         return ConversationHandler.END
 
+    user = identity.user
     if user.is_blocked:
         await query.edit_message_text('⛔ Аккаунт заблокирован')
         return ConversationHandler.END
@@ -103,7 +104,8 @@ async def take_task_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await query.edit_message_text('⚠️ У тебя уже есть активный выкуп этого задания')
         return ConversationHandler.END
 
-    first_step = await task.steps.order_by('order').afirst()
+    plan = await step_plans.aget(task)
+    first_step = plan.first()
     if not first_step:
         await query.edit_message_text('⚠️ В задании нет шагов')
         return ConversationHandler.END
@@ -121,15 +123,16 @@ async def take_task_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return await show_step(update, context, buyback, first_step)
 
 
-async def show_step(update: Update, context: ContextTypes.DEFAULT_TYPE, buyback: Buyback, step: TaskStep):
+async def show_step(update: Update, context: ContextTypes.DEFAULT_TYPE, buyback: Buyback, step: CompiledStep):
     """Показать шаг пользователю"""
-    task = await Task.objects.aget(id=buyback.task_id)
-    total_steps = await task.steps.acount()
+    task = await get_buyback_task(buyback)
+    plan = await step_plans.aget(task)
+    total_steps = plan.total
 
-    # Фиксируем время начала шага и сбрасываем флаг напоминания
-    buyback.step_started_at = timezone.now()
-    buyback.reminder_sent = False
-    await buyback.asave(update_fields=['step_started_at', 'reminder_sent'])
+    # Фиксируем время начала шага и рассчитываем дедлайны
+    buyback.start_step(step)
+    await buyback.asave(update_fields=Buyback.STEP_TIMER_FIELDS)
+    schedule_step_deadlines(buyback)
 
     # Для шага публикации отзыва — запускаем систему напоминаний
     if step.step_type == StepType.PUBLISH_REVIEW and (buyback.custom_publish_at or step.publish_time):
@@ -151,15 +154,15 @@ async def show_step(update: Update, context: ContextTypes.DEFAULT_TYPE, buyback:
     chat_id = update.effective_chat.id
 
     try:
-        if step.image:
-            with open(step.image.path, 'rb') as photo:
-                await context.bot.send_photo(
-                    chat_id=chat_id,
-                    photo=photo,
-                    caption=text,
-                    parse_mode='HTML',
-                    reply_markup=keyboard,
-                )
+        if step.image_name:
+            await send_step_photo(
+                context.bot,
+                chat_id,
+                step,
+                caption=text,
+                parse_mode='HTML',
+                reply_markup=keyboard,
+            )
         else:
             await context.bot.send_message(
                 chat_id=chat_id,
@@ -179,7 +182,32 @@ async def show_step(update: Update, context: ContextTypes.DEFAULT_TYPE, buyback:
     return WAITING_RESPONSE
 
 
-def get_step_keyboard(step: TaskStep, buyback_id: int):
+def _read_file(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+async def send_step_photo(bot, chat_id: int, step: CompiledStep, **kwargs):
+    """Картинка шага: по сохранённому file_id, иначе загрузка файла с диска"""
+    if step.image_file_id:
+        try:
+            return await bot.send_photo(chat_id=chat_id, photo=step.image_file_id, **kwargs)
+        except BadRequest:
+            logger.warning('Telegram не принял file_id картинки шага %s, загружаем заново', step.id)
+
+    image_name = step.image_name
+    photo = await asyncio.to_thread(_read_file, step.image_path)
+    message = await bot.send_photo(chat_id=chat_id, photo=photo, **kwargs)
+
+    # Запоминаем file_id только для той картинки, которую загрузили
+    file_id = message.photo[-1].file_id
+    updated = await TaskStep.objects.filter(pk=step.id, image=image_name).aupdate(image_file_id=file_id)
+    if updated:
+        step_plans.set_image_file_id(step, file_id)
+    return message
+
+
+def get_step_keyboard(step: CompiledStep, buyback_id: int):
     """Клавиатура для шага"""
     buttons = []
 
@@ -187,8 +215,7 @@ def get_step_keyboard(step: TaskStep, buyback_id: int):
         buttons.append([InlineKeyboardButton('✅ Готово', callback_data=f'confirm:{buyback_id}')])
 
     elif step.step_type == StepType.CHOICE:
-        choices = step.settings.get('choices', [])
-        for choice in choices:
+        for choice in step.choices:
             buttons.append([InlineKeyboardButton(choice, callback_data=f'choice:{buyback_id}:{choice}')])
 
     buttons.append([InlineKeyboardButton('❌ Отменить', callback_data=f'cancel:{buyback_id}')])
@@ -202,29 +229,15 @@ async def handle_response(update: Update, context: ContextTypes.DEFAULT_TYPE):
     step_id = context.user_data.get('step_id')
     step_type = context.user_data.get('step_type')
 
-    if not buyback_id or not step_id:
-        try:
-            user = await TelegramUser.objects.aget(telegram_id=update.effective_user.id)
-            buyback = await Buyback.objects.filter(
-                user=user,
-                status=Buyback.Status.IN_PROGRESS,
-            ).select_related('task').order_by('-started_at').afirst()
-
-            if buyback:
-                step = await TaskStep.objects.filter(
-                    task_id=buyback.task_id,
-                    order=buyback.current_step,
-                ).afirst()
-
-                if step:
-                    buyback_id = buyback.id
-                    step_id = step.id
-                    step_type = step.step_type
-                    context.user_data['buyback_id'] = buyback_id
-                    context.user_data['step_id'] = step_id
-                    context.user_data['step_type'] = step_type
-        except TelegramUser.DoesNotExist:
-            pass
+    identity = await aget_identity(update, context, with_buyback=True)
+
+    if (not buyback_id or not step_id) and identity and identity.buyback and identity.step:
+        buyback_id = identity.buyback.id
+        step_id = identity.step.id
+        step_type = identity.step.step_type
+        context.user_data['buyback_id'] = buyback_id
+        context.user_data['step_id'] = step_id
+        context.user_data['step_type'] = step_type
 
     if not buyback_id or not step_id:
         await update.message.reply_text(
@@ -233,26 +246,24 @@ async def handle_response(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return ConversationHandler.END
 
-    try:
-        buyback = await Buyback.objects.select_related('task__product').aget(id=buyback_id)
-        step = await TaskStep.objects.aget(id=step_id)
-    except (Buyback.DoesNotExist, TaskStep.DoesNotExist):
+    if identity and identity.buyback and identity.buyback.id == buyback_id:
+        buyback = identity.buyback
+    else:
+        try:
+            buyback = await Buyback.objects.select_related('task__product').aget(id=buyback_id)
+        except Buyback.DoesNotExist:
+            await update.message.reply_text('⚠️ Ошибка. Начни заново.')
+            return ConversationHandler.END
+
+    plan = await step_plans.aget(buyback.task)
+    step = plan.get_by_id(step_id)
+    if not step:
         await update.message.reply_text('⚠️ Ошибка. Начни заново.')
         return ConversationHandler.END
 
     # Проверка таймаута
-    if step.timeout_minutes and buyback.step_started_at:
-        from datetime import timedelta
-        deadline = buyback.step_started_at + timedelta(minutes=step.timeout_minutes)
-        if timezone.now() > deadline:
-            buyback.status = Buyback.Status.EXPIRED
-            await buyback.asave(update_fields=['status'])
-            await update.message.reply_text(
-                '⏰ Время на выполнение этого шага истекло. Выкуп отменён.',
-                reply_markup=main_menu_keyboard(),
-            )
-            context.user_data.clear()
-            return ConversationHandler.END
+    if await check_step_timeout(buyback):
+        return await reply_step_expired(update, context)
 
     if step_type in (StepType.PHOTO, StepType.PUBLISH_REVIEW):
         if not update.message.photo:
@@ -264,11 +275,7 @@ async def handle_response(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         photo = update.message.photo[-1]
         try:
-            file = await photo.get_file()
-            file_path = f'buybacks/{buyback_id}/step_{step.order}_{photo.file_id}.jpg'
-            full_path = os.path.join(settings.MEDIA_ROOT, file_path)
-            os.makedirs(os.path.dirname(full_path), exist_ok=True)
-            await file.download_to_drive(full_path)
+            file_path = await photo_ingestor.ingest(photo, buyback_id)
         except Exception:
             logger.exception('Ошибка при скачивании фото (buyback=%s, step=%s)', buyback_id, step.id)
             await update.message.reply_text('⚠️ Не удалось загрузить фото. Попробуй отправить ещё раз.')
@@ -295,16 +302,11 @@ async def handle_response(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     status = BuybackResponse.Status.PENDING if validator.requires_moderation else BuybackResponse.Status.AUTO_APPROVED
 
-    await BuybackResponse.objects.acreate(
-        buyback=buyback,
-        step=step,
-        response_data=result.data,
-        status=status,
-    )
+    # На модерацию — только если выкуп не истёк параллельно (статус и ответ одной транзакцией)
+    if not await sync_to_async(submit_response)(buyback, step.id, result.data, status):
+        return await reply_step_expired(update, context)
 
     if status == BuybackResponse.Status.PENDING:
-        buyback.status = Buyback.Status.ON_MODERATION
-        await buyback.asave(update_fields=['status'])
 
         # Отменяем напоминания если это был шаг публикации отзыва
         if step.step_type == StepType.PUBLISH_REVIEW:
@@ -320,7 +322,7 @@ async def handle_response(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return await advance_to_next_step(update, context, buyback)
 
 
-async def handle_payment_input(update: Update, context: ContextTypes.DEFAULT_TYPE, buyback: Buyback, step: TaskStep):
+async def handle_payment_input(update: Update, context: ContextTypes.DEFAULT_TYPE, buyback: Buyback, step: CompiledStep):
     """Обработка многошагового ввода реквизитов"""
     payment_step = context.user_data.get('payment_step', 'phone')
     text = update.message.text.strip()
@@ -348,7 +350,7 @@ async def handle_payment_input(update: Update, context: ContextTypes.DEFAULT_TYP
 
         await BuybackResponse.objects.acreate(
             buyback=buyback,
-            step=step,
+            step_id=step.id,
             response_data={
                 'phone': user.phone,
                 'bank_name': user.bank_name,
@@ -365,17 +367,22 @@ async def handle_payment_input(update: Update, context: ContextTypes.DEFAULT_TYP
 async def advance_to_next_step(update: Update, context: ContextTypes.DEFAULT_TYPE, buyback: Buyback):
     """Переход к следующему шагу"""
     try:
-        task = await Task.objects.aget(id=buyback.task_id)
-        next_step = await task.steps.filter(order__gt=buyback.current_step).order_by('order').afirst()
+        task = await get_buyback_task(buyback)
+        plan = await step_plans.aget(task)
+        next_step = plan.next_after(buyback.current_step)
 
         if next_step:
-            buyback.current_step = next_step.order
-            await buyback.asave(update_fields=['current_step'])
+            if not await buyback.asave_if_status(Buyback.Status.IN_PROGRESS, current_step=next_step.order):
+                return await reply_step_expired(update, context)
             return await show_step(update, context, buyback, next_step)
 
-        buyback.status = Buyback.Status.PENDING_REVIEW
-        buyback.completed_at = timezone.now()
-        await buyback.asave(update_fields=['status', 'completed_at'])
+        completed = await buyback.asave_if_status(
+            Buyback.Status.IN_PROGRESS,
+            status=Buyback.Status.PENDING_REVIEW,
+            completed_at=timezone.now(),
+        )
+        if not completed:
+            return await reply_step_expired(update, context)
 
         text = (
             '🎉 <b>Все шаги выполнены!</b>\n\n'
@@ -406,18 +413,24 @@ async def advance_to_next_step(update: Update, context: ContextTypes.DEFAULT_TYP
         return ConversationHandler.END
 
 
-async def check_step_timeout(buyback, step):
-    """Проверка истёк ли таймаут шага"""
-    if step.timeout_minutes and buyback.step_started_at:
-        from datetime import timedelta
-        deadline = buyback.step_started_at + timedelta(minutes=step.timeout_minutes)
-        if timezone.now() > deadline:
-            buyback.status = Buyback.Status.EXPIRED
-            await buyback.asave(update_fields=['status'])
-            return True
+async def check_step_timeout(buyback) -> bool:
+    """Истёк ли выкуп по таймауту шага сейчас (тем же UPDATE, что и фоновая задача)"""
+    if buyback.is_step_expired():
+        return bool(await expire_buybacks([buyback.id]))
     return False
 
 
+async def reply_step_expired(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Сообщить, что выкуп истёк, и завершить диалог"""
+    text = '⏰ Время на выполнение этого шага истекло. Выкуп отменён.'
+    if update.callback_query:
+        await safe_edit_message(update.callback_query, text)
+    else:
+        await update.message.reply_text(text, reply_markup=main_menu_keyboard())
+    context.user_data.clear()
+    return ConversationHandler.END
+
+
 async def confirm_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Кнопка подтверждения"""
     query = update.callback_query
@@ -426,22 +439,25 @@ async def confirm_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     buyback_id = int(query.data.split(':')[1])
 
     try:
-        buyback = await Buyback.objects.aget(id=buyback_id)
-        step = await TaskStep.objects.aget(task_id=buyback.task_id, order=buyback.current_step)
-    except (Buyback.DoesNotExist, TaskStep.DoesNotExist):
+        buyback = await Buyback.objects.select_related('task__product').aget(id=buyback_id)
+    except Buyback.DoesNotExist:
         await safe_edit_message(query, '⚠️ Ошибка')
         return ConversationHandler.END
 
-    if await check_step_timeout(buyback, step):
-        await safe_edit_message(query, '⏰ Время на выполнение этого шага истекло. Выкуп отменён.')
-        context.user_data.clear()
+    plan = await step_plans.aget(buyback.task)
+    step = plan.get(buyback.current_step)
+    if not step:
+        await safe_edit_message(query, '⚠️ Ошибка')
         return ConversationHandler.END
 
+    if await check_step_timeout(buyback):
+        return await reply_step_expired(update, context)
+
     context.user_data['buyback_id'] = buyback.id
 
     await BuybackResponse.objects.acreate(
         buyback=buyback,
-        step=step,
+        step_id=step.id,
         response_data={'confirmed': True},
         status=BuybackResponse.Status.AUTO_APPROVED,
     )
@@ -461,22 +477,25 @@ async def choice_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     choice = parts[2]
 
     try:
-        buyback = await Buyback.objects.aget(id=buyback_id)
-        step = await TaskStep.objects.aget(task_id=buyback.task_id, order=buyback.current_step)
-    except (Buyback.DoesNotExist, TaskStep.DoesNotExist):
+        buyback = await Buyback.objects.select_related('task__product').aget(id=buyback_id)
+    except Buyback.DoesNotExist:
         await safe_edit_message(query, '⚠️ Ошибка')
         return ConversationHandler.END
 
-    if await check_step_timeout(buyback, step):
-        await safe_edit_message(query, '⏰ Время на выполнение этого шага истекло. Выкуп отменён.')
-        context.user_data.clear()
+    plan = await step_plans.aget(buyback.task)
+    step = plan.get(buyback.current_step)
+    if not step:
+        await safe_edit_message(query, '⚠️ Ошибка')
         return ConversationHandler.END
 
+    if await check_step_timeout(buyback):
+        return await reply_step_expired(update, context)
+
     context.user_data['buyback_id'] = buyback.id
 
     await BuybackResponse.objects.acreate(
         buyback=buyback,
-        step=step,
+        step_id=step.id,
         response_data={'choice': choice},
         status=BuybackResponse.Status.AUTO_APPROVED,
     )
@@ -499,8 +518,10 @@ async def cancel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await safe_edit_message(query, '⚠️ Выкуп не найден')
         return ConversationHandler.END
 
-    buyback.status = Buyback.Status.CANCELLED
-    await buyback.asave(update_fields=['status'])
+    if not await buyback.acancel():
+        await safe_edit_message(query, '⚠️ Этот выкуп уже нельзя отменить')
+        context.user_data.clear()
+        return ConversationHandler.END
 
     await safe_edit_message(query, '❌ Выкуп отменён')
 
@@ -2,17 +2,17 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from django.conf import settings
 
-from account.models import TelegramUser
+from bot.identity import aget_identity
 from bot.keyboards.reply import main_menu_keyboard
 
 
 async def profile_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Профиль пользователя"""
-    try:
-        user = await TelegramUser.objects.aget(telegram_id=update.effective_user.id)
-    except TelegramUser.DoesNotExist:
+    identity = await aget_identity(update, context)
+    if not identity:
         await update.message.reply_text('⚠️ Профиль не найден. Нажми /start')
         return
+    user = identity.user
 
     # Реквизиты
     if user.has_payment_info:
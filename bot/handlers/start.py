@@ -3,6 +3,7 @@ from telegram.ext import ContextTypes
 from django.conf import settings
 
 from account.models import TelegramUser
+from bot.identity import aget_identity
 from bot.keyboards.reply import main_menu_keyboard
 from bot.keyboards.inline import onboarding_keyboard
 
@@ -11,20 +12,21 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка команды /start"""
     tg_user = update.effective_user
 
-    user, created = await TelegramUser.objects.aget_or_create(
-        telegram_id=tg_user.id,
-        defaults={
-            'username': tg_user.username or '',
-            'first_name': tg_user.first_name or '',
-            'last_name': tg_user.last_name or '',
-        }
-    )
-
-    if not created:
-        user.username = tg_user.username or ''
-        user.first_name = tg_user.first_name or ''
-        user.last_name = tg_user.last_name or ''
-        await user.asave(update_fields=['username', 'first_name', 'last_name', 'updated_at'])
+    names = {
+        'username': tg_user.username or '',
+        'first_name': tg_user.first_name or '',
+        'last_name': tg_user.last_name or '',
+    }
+
+    identity = await aget_identity(update, context)
+    if identity:
+        user = identity.user
+        if any(getattr(user, field) != value for field, value in names.items()):
+            for field, value in names.items():
+                setattr(user, field, value)
+            await user.asave(update_fields=[*names, 'updated_at'])
+    else:
+        user, _ = await TelegramUser.objects.aget_or_create(telegram_id=tg_user.id, defaults=names)
 
     if user.is_blocked:
         await update.message.reply_text('⛔ Ваш аккаунт заблокирован.')
@@ -60,11 +62,11 @@ async def onboarding_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     action = query.data.split(':')[1]
 
-    try:
-        user = await TelegramUser.objects.aget(telegram_id=update.effective_user.id)
-    except TelegramUser.DoesNotExist:
+    identity = await aget_identity(update, context)
+    if not identity:
         await query.edit_message_text('⚠️ Ошибка. Нажми /start')
         return
+    user = identity.user
 
     if action == 'excluded':
         user.has_excluded_reviews = True
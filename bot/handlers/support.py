@@ -1,8 +1,8 @@
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, ConversationHandler
 
-from account.models import TelegramUser
 from support.models import Ticket, Message
+from bot.identity import aget_identity
 from bot.keyboards.reply import main_menu_keyboard
 
 
@@ -12,11 +12,11 @@ WAITING_MESSAGE = 1
 
 async def support_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Кнопка Поддержка"""
-    try:
-        user = await TelegramUser.objects.aget(telegram_id=update.effective_user.id)
-    except TelegramUser.DoesNotExist:
+    identity = await aget_identity(update, context)
+    if not identity:
         await update.message.reply_text('⚠️ Нажми /start')
         return ConversationHandler.END
+    user = identity.user
 
     # Ищем открытый тикет или создаём новый
     ticket = await Ticket.objects.filter(
@@ -1,32 +1,23 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 
-from account.models import TelegramUser
-from catalog.models import Task
+from bot.catalog_cache import catalog_cache
+from bot.identity import aget_identity
 from bot.keyboards.inline import tasks_list_keyboard, task_detail_keyboard
 
 
 async def tasks_list_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Список доступных заданий"""
-    try:
-        user = await TelegramUser.objects.aget(telegram_id=update.effective_user.id)
-    except TelegramUser.DoesNotExist:
+    identity = await aget_identity(update, context)
+    if not identity:
         await update.message.reply_text('⚠️ Нажми /start')
         return
 
-    if user.is_blocked:
+    if identity.user.is_blocked:
         await update.message.reply_text('⛔ Аккаунт заблокирован')
         return
 
-    tasks = []
-    async for task in Task.objects.filter(
-        is_active=True,
-        product__is_active=True,
-    ).select_related('product'):
-        # Проверяем есть ли товар
-        available = await task.product.aget_quantity_available()
-        if available > 0:
-            tasks.append(task)
+    tasks = await catalog_cache.aget_available_tasks()
 
     if not tasks:
         await update.message.reply_text(
@@ -51,32 +42,25 @@ async def task_detail_callback(update: Update, context: ContextTypes.DEFAULT_TYP
 
     task_id = int(query.data.split(':')[1])
 
-    try:
-        task = await Task.objects.select_related('product').aget(id=task_id)
-    except Task.DoesNotExist:
+    task = await catalog_cache.aget_task(task_id)
+    if not task:
         await query.edit_message_text('⚠️ Задание не найдено')
         return
 
-    # Считаем шаги
-    steps_count = await task.steps.acount()
-
-    # Доступное количество
-    available = await task.product.aget_quantity_available()
-
     text = (
         f'📦 <b>{task.title}</b>\n\n'
         f'🏷 Товар: {task.product.name}\n'
         f'💰 Цена: {task.product.price}₽\n'
         f'💵 Выплата: <b>{task.payout}₽</b>\n\n'
-        f'📝 Шагов: {steps_count}\n'
-        f'📊 Осталось: {available} шт.\n'
+        f'📝 Шагов: {task.steps_count}\n'
+        f'📊 Осталось: {task.available} шт.\n'
         f'👤 Лимит: {task.product.get_limit_display()}'
     )
 
     await query.edit_message_text(
         text,
         parse_mode='HTML',
-        reply_markup=task_detail_keyboard(task.id, available > 0),
+        reply_markup=task_detail_keyboard(task.id, task.available > 0),
     )
 
 
@@ -85,14 +69,7 @@ async def tasks_list_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
     query = update.callback_query
     await query.answer()
 
-    tasks = []
-    async for task in Task.objects.filter(
-        is_active=True,
-        product__is_active=True,
-    ).select_related('product'):
-        available = task.product.quantity_total - task.product.quantity_completed
-        if available > 0:
-            tasks.append(task)
+    tasks = await catalog_cache.aget_available_tasks()
 
     if not tasks:
         await query.edit_message_text(
@@ -105,4 +82,4 @@ async def tasks_list_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
         '📋 <b>Доступные задания</b>\n\nВыбери задание:',
         parse_mode='HTML',
         reply_markup=tasks_list_keyboard(tasks),
-    )
\ No newline at end of file
+    )
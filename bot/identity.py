@@ -0,0 +1,199 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from telegram import Update
+from telegram.ext import CallbackContext
+
+from account.models import TelegramUser
+from pipeline.models import Buyback
+from bot.step_plan import step_plans
+
+
+class Identity:
+    """Пользователь, его активный выкуп и текущий шаг.
+
+    buyback_resolved — выкуп уже искали (buyback=None тогда значит «активного
+    выкупа нет»); для экранов меню его не ищут вовсе.
+    """
+
+    __slots__ = ('user', 'buyback', 'step', 'buyback_resolved')
+
+    def __init__(self, user, buyback=None, step=None, buyback_resolved=False):
+        self.user = user
+        self.buyback = buyback
+        self.step = step
+        self.buyback_resolved = buyback_resolved
+
+
+class BotContext(CallbackContext):
+    """Контекст апдейта с результатом identity_middleware"""
+
+    identity: Identity | None = None
+
+
+class IdentityCache:
+    """LRU-кэш Identity по telegram_id.
+
+    Кэшируется и найденный активный выкуп, и его отсутствие. Записи
+    самого бота обновляют запись на месте (refresh_user / refresh_buyback).
+    Переходы из процесса бэкофиса (модерация) сопровождаются сообщением
+    пользователю через outbox — воркер при отправке сбрасывает выкуп
+    в записи (reset_buyback), остальное догоняет TTL.
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[int, tuple[Identity, float]] = OrderedDict()
+        self._telegram_ids: dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, telegram_id: int) -> Identity | None:
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry is None:
+                return None
+            identity, expires_at = entry
+            if expires_at < time.monotonic():
+                self._pop(telegram_id)
+                return None
+            self._entries.move_to_end(telegram_id)
+            return identity
+
+    def put(self, telegram_id: int, identity: Identity, refresh: bool = True):
+        """Сохранить Identity; refresh=False — оставить срок жизни прежней записи.
+
+        Срок считается от загрузки строки TelegramUser: перепроверка выкупа
+        его не продлевает, иначе блокировка из бэкофиса не дойдёт до активного
+        пользователя.
+        """
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if refresh or entry is None:
+                expires_at = time.monotonic() + self.ttl
+            else:
+                expires_at = entry[1]
+            self._entries[telegram_id] = (identity, expires_at)
+            self._entries.move_to_end(telegram_id)
+            self._telegram_ids[identity.user.id] = telegram_id
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._pop(oldest)
+
+    def refresh_user(self, user):
+        """Бот сохранил TelegramUser — подменяем строку в записи (срок не продлевается)"""
+        with self._lock:
+            entry = self._entries.get(user.telegram_id)
+            if entry is None:
+                return
+            identity, expires_at = entry
+            self._entries[user.telegram_id] = (
+                Identity(user, identity.buyback, identity.step, identity.buyback_resolved),
+                expires_at,
+            )
+
+    def refresh_buyback(self, buyback, step, created: bool = False):
+        """Бот сохранил выкуп — обновляем запись на месте.
+
+        Текущий (или только что взятый) выкуп в работе подменяется вместе
+        с шагом; если выкуп из работы ушёл или это другой выкуп — выкуп
+        в записи будет найден заново при следующем обращении.
+        """
+        with self._lock:
+            telegram_id = self._telegram_ids.get(buyback.user_id)
+            entry = self._entries.get(telegram_id) if telegram_id is not None else None
+            if entry is None:
+                return
+            identity, expires_at = entry
+            same = identity.buyback_resolved and (
+                created or identity.buyback is None or identity.buyback.id == buyback.id
+            )
+            if same and step is not None and buyback.status == Buyback.Status.IN_PROGRESS:
+                identity = Identity(identity.user, buyback, step, True)
+            else:
+                identity = Identity(identity.user)
+            self._entries[telegram_id] = (identity, expires_at)
+
+    def reset_buyback(self, telegram_id: int):
+        """Выкуп мог смениться в другом процессе — перепроверить при следующем обращении"""
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry is not None and entry[0].buyback_resolved:
+                self._entries[telegram_id] = (Identity(entry[0].user), entry[1])
+
+    def invalidate_user(self, user_id: int):
+        """Сбросить запись по TelegramUser.id"""
+        with self._lock:
+            telegram_id = self._telegram_ids.get(user_id)
+            if telegram_id is not None:
+                self._pop(telegram_id)
+
+    def _pop(self, telegram_id: int):
+        entry = self._entries.pop(telegram_id, None)
+        if entry is not None:
+            self._telegram_ids.pop(entry[0].user.id, None)
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+        }
+
+
+identity_cache = IdentityCache(
+    maxsize=settings.BOT_IDENTITY_CACHE_SIZE,
+    ttl=settings.BOT_IDENTITY_CACHE_TTL,
+)
+
+
+async def aresolve_identity(telegram_id: int, with_buyback: bool = False) -> Identity | None:
+    """Найти пользователя, а с with_buyback — и активный выкуп с шагом (через кэш)"""
+    identity = identity_cache.get(telegram_id)
+    if identity is not None and (identity.buyback_resolved or not with_buyback):
+        identity_cache.hits += 1
+        return identity
+
+    identity_cache.misses += 1
+
+    user_loaded = identity is None
+    if user_loaded:
+        user = await TelegramUser.objects.filter(telegram_id=telegram_id).afirst()
+        if not user:
+            return None
+        identity = Identity(user)
+
+    if with_buyback:
+        buyback = await Buyback.objects.filter(
+            user=identity.user,
+            status=Buyback.Status.IN_PROGRESS,
+        ).select_related('task__product').order_by('-started_at').afirst()
+
+        step = None
+        if buyback:
+            plan = await step_plans.aget(buyback.task)
+            step = plan.get(buyback.current_step)
+        identity = Identity(identity.user, buyback, step, True)
+
+    identity_cache.put(telegram_id, identity, refresh=user_loaded)
+    return identity
+
+
+async def identity_middleware(update: Update, context: BotContext):
+    """Группа -1: резолвим пользователя до остальных обработчиков (выкуп — лениво, в сценарии)"""
+    if not update.effective_user:
+        return
+    context.identity = await aresolve_identity(update.effective_user.id)
+
+
+async def aget_identity(update: Update, context: BotContext, with_buyback: bool = False) -> Identity | None:
+    """Identity из контекста; with_buyback — догрузить активный выкуп, если его ещё не искали"""
+    identity = getattr(context, 'identity', None)
+    if identity is None or (with_buyback and not identity.buyback_resolved):
+        identity = await aresolve_identity(update.effective_user.id, with_buyback=with_buyback)
+        context.identity = identity
+    return identity
@@ -1,44 +1,21 @@
-from django.core.management.base import BaseCommand
-from telegram.ext import Application
 from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 
-from bot.handlers import register_handlers
-from bot.reminders import check_reminders_job, check_timeouts_job, check_step_reminders_job
+from bot.application import build_application
 
 
 class Command(BaseCommand):
     help = 'Запуск бота в режиме polling'
 
     def handle(self, *args, **options):
-        self.stdout.write('🤖 Запуск бота...')
-
-        application = Application.builder().token(settings.BOT_TOKEN).build()
-        register_handlers(application)
+        if settings.BOT_WEBHOOK_URL:
+            raise CommandError(
+                'Включён webhook (BOT_WEBHOOK_URL) — бот работает внутри ASGI-приложения (core.asgi)'
+            )
 
-        # Периодическая проверка напоминаний (publish_review) каждые 30 секунд
-        application.job_queue.run_repeating(
-            check_reminders_job,
-            interval=30,
-            first=10,
-            name='check_reminders',
-        )
-
-        # Проверка таймаутов каждые 60 секунд
-        application.job_queue.run_repeating(
-            check_timeouts_job,
-            interval=60,
-            first=15,
-            name='check_timeouts',
-        )
+        self.stdout.write('🤖 Запуск бота...')
 
-        # Напоминания по шагам каждые 60 секунд
-        application.job_queue.run_repeating(
-            check_step_reminders_job,
-            interval=60,
-            first=20,
-            name='check_step_reminders',
-        )
+        application = build_application()
 
-        self.stdout.write('📅 Планировщик задач запущен')
         self.stdout.write(self.style.SUCCESS('✅ Бот запущен'))
-        application.run_polling(drop_pending_updates=True)
\ No newline at end of file
+        application.run_polling(drop_pending_updates=True)
@@ -0,0 +1,135 @@
+import bisect
+import logging
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм (секунды)
+LAG_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600)
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами; count/sum/max за окно"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Верхняя граница корзины, в которую попадает квантиль q"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def summary(self) -> str:
+        if not self.count:
+            return '-'
+        return (
+            f'n={self.count} avg={self.sum / self.count:.2f} '
+            f'p50≤{self.quantile(0.5):g} p95≤{self.quantile(0.95):g} max={self.max:.2f}'
+        )
+
+
+class JobMetrics:
+    """Метрики одной задачи планировщика.
+
+    lag — насколько позже дедлайна обработана строка, duration — время
+    прогона, scanned/acted — сколько строк выбрано и сколько реально
+    обработано, sent_ok/sent_failed — результаты отправок. overlaps —
+    прогоны, начатые до завершения предыдущего.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lag = Histogram(LAG_BUCKETS)
+        self.duration = Histogram(DURATION_BUCKETS)
+        self._running = 0
+        self.reset()
+
+    def reset(self):
+        self.lag.reset()
+        self.duration.reset()
+        self.runs = 0
+        self.overlaps = 0
+        self.scanned = 0
+        self.acted = 0
+        self.sent_ok = 0
+        self.sent_failed = 0
+
+    @contextmanager
+    def run(self):
+        if self._running:
+            self.overlaps += 1
+        self._running += 1
+        self.runs += 1
+        started = time.monotonic()
+        try:
+            yield self
+        finally:
+            self._running -= 1
+            self.duration.observe(time.monotonic() - started)
+
+    def observe_lag(self, deadline: datetime, now: datetime | None = None):
+        if deadline is None:
+            return
+        lag = ((now or timezone.now()) - deadline).total_seconds()
+        self.lag.observe(max(lag, 0.0))
+
+    def record_send(self, ok: bool):
+        if ok:
+            self.sent_ok += 1
+        else:
+            self.sent_failed += 1
+
+    def summary(self) -> str:
+        return (
+            f'{self.name}: runs={self.runs} overlaps={self.overlaps} '
+            f'scanned={self.scanned} acted={self.acted} '
+            f'sent={self.sent_ok} failed={self.sent_failed} | '
+            f'lag[{self.lag.summary()}] duration[{self.duration.summary()}]'
+        )
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._jobs: dict[str, JobMetrics] = {}
+
+    def job(self, name: str) -> JobMetrics:
+        metrics = self._jobs.get(name)
+        if metrics is None:
+            metrics = self._jobs[name] = JobMetrics(name)
+        return metrics
+
+    def log_summary(self, extra: dict[str, dict] | None = None):
+        """Записать сводку в лог и начать новое окно"""
+        for metrics in self._jobs.values():
+            logger.info('[metrics] %s', metrics.summary())
+            metrics.reset()
+        for name, stats in (extra or {}).items():
+            logger.info('[metrics] %s: %s', name, ' '.join(f'{key}={value}' for key, value in stats.items()))
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-17 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BotStateEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('user_data', 'Данные пользователя'), ('conversation', 'Диалог')], max_length=20, verbose_name='Тип')),
+                ('key', models.CharField(max_length=255, verbose_name='Ключ')),
+                ('data', models.JSONField(default=dict, verbose_name='Данные')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Состояние бота',
+                'verbose_name_plural': 'Состояние бота',
+                'unique_together': {('kind', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0.1 on 2026-10-17 18:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bonus', '0002_migrate_to_telegramuser'),
+        ('bot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bot', models.CharField(choices=[('main', 'Основной бот'), ('bonus', 'Бонус-бот')], default='main', max_length=10, verbose_name='Бот')),
+                ('chat_id', models.BigIntegerField(verbose_name='Chat ID')),
+                ('payload', models.JSONField(default=dict, help_text='text, parse_mode, reply_markup', verbose_name='Параметры sendMessage')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('sent', 'Отправлено'), ('failed', 'Не доставлено')], default='pending', max_length=10, verbose_name='Статус')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Следующая попытка')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='Захвачено до')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('telegram_message_id', models.BigIntegerField(blank=True, null=True, verbose_name='Telegram Message ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Отправлено')),
+                ('bonus_message', models.ForeignKey(blank=True, help_text='После отправки сюда записывается telegram_message_id', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='outbox', to='bonus.bonusmessage', verbose_name='Сообщение бонус-бота')),
+            ],
+            options={
+                'verbose_name': 'Исходящее сообщение',
+                'verbose_name_plural': 'Исходящие сообщения',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['next_attempt_at'], name='outbox_pending_idx')],
+            },
+        ),
+    ]
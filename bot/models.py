@@ -1,3 +1,132 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class BotStateEntry(models.Model):
+    """Состояние бота между перезапусками (user_data, диалоги)"""
+
+    class Kind(models.TextChoices):
+        USER_DATA = 'user_data', 'Данные пользователя'
+        CONVERSATION = 'conversation', 'Диалог'
+
+    kind = models.CharField(
+        'Тип',
+        max_length=20,
+        choices=Kind.choices,
+    )
+    key = models.CharField(
+        'Ключ',
+        max_length=255,
+    )
+    data = models.JSONField(
+        'Данные',
+        default=dict,
+    )
+    updated_at = models.DateTimeField(
+        'Дата обновления',
+        auto_now=True,
+    )
+
+    class Meta:
+        verbose_name = 'Состояние бота'
+        verbose_name_plural = 'Состояние бота'
+        unique_together = ['kind', 'key']
+
+    def __str__(self):
+        return f'{self.get_kind_display()}: {self.key}'
+
+
+class OutboxMessage(models.Model):
+    """Исходящее сообщение Telegram из кода Django (транзакционный outbox).
+
+    Строка пишется в той же транзакции, что и изменение данных; отправляет
+    её воркер в процессе бота (bot.outbox_worker) с повторами и
+    dead-letter статусом.
+    """
+
+    class Bot(models.TextChoices):
+        MAIN = 'main', 'Основной бот'
+        BONUS = 'bonus', 'Бонус-бот'
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'В очереди'
+        SENT = 'sent', 'Отправлено'
+        FAILED = 'failed', 'Не доставлено'
+
+    bot = models.CharField(
+        'Бот',
+        max_length=10,
+        choices=Bot.choices,
+        default=Bot.MAIN,
+    )
+    chat_id = models.BigIntegerField(
+        'Chat ID',
+    )
+    payload = models.JSONField(
+        'Параметры sendMessage',
+        default=dict,
+        help_text='text, parse_mode, reply_markup',
+    )
+    bonus_message = models.ForeignKey(
+        'bonus.BonusMessage',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='outbox',
+        verbose_name='Сообщение бонус-бота',
+        help_text='После отправки сюда записывается telegram_message_id',
+    )
+
+    status = models.CharField(
+        'Статус',
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+    attempts = models.PositiveIntegerField(
+        'Попыток',
+        default=0,
+    )
+    next_attempt_at = models.DateTimeField(
+        'Следующая попытка',
+        default=timezone.now,
+    )
+    locked_until = models.DateTimeField(
+        'Захвачено до',
+        null=True,
+        blank=True,
+    )
+    last_error = models.TextField(
+        'Последняя ошибка',
+        blank=True,
+    )
+    telegram_message_id = models.BigIntegerField(
+        'Telegram Message ID',
+        null=True,
+        blank=True,
+    )
+
+    created_at = models.DateTimeField(
+        'Создано',
+        auto_now_add=True,
+    )
+    sent_at = models.DateTimeField(
+        'Отправлено',
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = 'Исходящее сообщение'
+        verbose_name_plural = 'Исходящие сообщения'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at'],
+                name='outbox_pending_idx',
+                condition=models.Q(status='pending'),
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.get_bot_display()} → {self.chat_id} ({self.get_status_display()})'
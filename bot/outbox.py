@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+
+def enqueue_message(
+    chat_id: int,
+    text: str,
+    *,
+    bot: str = OutboxMessage.Bot.MAIN,
+    parse_mode: str | None = 'HTML',
+    reply_markup: dict | None = None,
+    bonus_message=None,
+) -> OutboxMessage:
+    """Поставить сообщение в outbox.
+
+    Строка пишется в текущей транзакции: откатилось изменение — не уйдёт
+    и сообщение. Сама отправка происходит в процессе бота.
+    """
+    payload = {'text': text}
+    if parse_mode:
+        payload['parse_mode'] = parse_mode
+    if reply_markup:
+        payload['reply_markup'] = reply_markup
+
+    return OutboxMessage.objects.create(
+        bot=bot,
+        chat_id=chat_id,
+        payload=payload,
+        bonus_message=bonus_message,
+    )
+
+
+def claim_pending(batch_size: int, lease_seconds: int, now=None) -> list[OutboxMessage]:
+    """Захватить пачку сообщений к отправке (SKIP LOCKED + аренда, как у напоминаний)"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.filter(
+                Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+                status=OutboxMessage.Status.PENDING,
+                next_attempt_at__lte=now,
+            ).order_by('next_attempt_at').select_for_update(skip_locked=True)[:batch_size]
+        )
+        if messages:
+            OutboxMessage.objects.filter(id__in=[m.id for m in messages]).update(
+                locked_until=now + timedelta(seconds=lease_seconds),
+            )
+    return messages
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Экспоненциальная задержка повтора: 5 с, 10 с, 20 с ... не больше часа"""
+    return timedelta(seconds=min(5 * 2 ** (attempts - 1), 3600))
+
+
+def record_results(messages: list[OutboxMessage]):
+    """Сохранить результаты отправки пачки одной транзакцией"""
+    from bonus.models import BonusMessage
+
+    with transaction.atomic():
+        OutboxMessage.objects.bulk_update(
+            messages,
+            ['status', 'attempts', 'next_attempt_at', 'locked_until', 'last_error', 'telegram_message_id', 'sent_at'],
+        )
+        for message in messages:
+            if message.bonus_message_id and message.telegram_message_id:
+                BonusMessage.objects.filter(pk=message.bonus_message_id).update(
+                    telegram_message_id=message.telegram_message_id,
+                )
+
+
+def prune_sent_messages(older_than_days: int, chunk_size: int = 5000) -> int:
+    """Удалить отправленные сообщения старше older_than_days (пачками)"""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    sent = OutboxMessage.objects.filter(status=OutboxMessage.Status.SENT, created_at__lt=cutoff)
+
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(sent.order_by('created_at').values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                return deleted
+            count, _ = OutboxMessage.objects.filter(id__in=ids).delete()
+            deleted += count
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+from core import telegram as telegram_api
+from .identity import identity_cache
+from .models import OutboxMessage
+from .outbox import claim_pending, record_results, retry_delay
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxWorker:
+    """Отправка сообщений из outbox в процессе бота.
+
+    Забирает пачки (несколько экземпляров бота не мешают друг другу),
+    отправляет параллельно, результаты пачки пишет одной транзакцией.
+    Основной бот — application.bot (общий лимитер), бонус-бот — пул
+    соединений core.telegram.
+    Ошибки сети повторяются с экспоненциальной задержкой (или через
+    retry_after, если его указал Telegram); после
+    max_attempts, а также при Forbidden/BadRequest сообщение получает
+    статус FAILED (dead letter).
+    Сообщения основного бота сбрасывают выкуп в кэше Identity получателя.
+    """
+
+    def __init__(self, bots: dict, batch_size: int, lease_seconds: int, poll_interval: float, max_attempts: int):
+        self.bots = bots
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._task: asyncio.Task | None = None
+
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+
+    async def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                claimed = await self.drain_once()
+            except Exception:
+                logger.exception('Ошибка воркера outbox')
+                claimed = 0
+            if claimed < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    async def drain_once(self) -> int:
+        messages = await sync_to_async(claim_pending)(self.batch_size, self.lease_seconds)
+        if not messages:
+            return 0
+        for message in messages:
+            if message.bot == OutboxMessage.Bot.MAIN:
+                # Сообщение пишется вместе с переходом выкупа в другом процессе
+                identity_cache.reset_buyback(message.chat_id)
+        await asyncio.gather(*(self._deliver(message) for message in messages))
+        await sync_to_async(record_results)(messages)
+        return len(messages)
+
+    async def _deliver(self, message: OutboxMessage):
+        message.attempts += 1
+        message.locked_until = None
+
+        bot = self.bots.get(message.bot)
+        if bot is None:
+            self._fail(message, f'Бот {message.bot} не настроен')
+            return
+
+        try:
+            message.telegram_message_id = await self._send(bot, message)
+        except (Forbidden, BadRequest) as e:
+            # Пользователь заблокировал бота или сообщение некорректно — повтор не поможет
+            self._fail(message, str(e))
+            return
+        except RetryAfter as e:
+            # Лимитер бота исчерпал свои повторы — ждём столько, сколько просит Telegram
+            self._retry(message, str(e), e.retry_after)
+            return
+        except telegram_api.TelegramAPIError as e:
+            if e.permanent:
+                self._fail(message, str(e))
+                return
+            self._retry(message, str(e), e.retry_after)
+            return
+        except Exception as e:
+            self._retry(message, str(e))
+            return
+
+        message.status = OutboxMessage.Status.SENT
+        message.sent_at = timezone.now()
+        message.last_error = ''
+        self.sent += 1
+
+    @staticmethod
+    async def _send(bot, message: OutboxMessage) -> int:
+        """Отправить и вернуть message_id"""
+        payload = dict(message.payload)
+        if isinstance(bot, telegram_api.AsyncTelegramClient):
+            result = await bot.send_message(message.chat_id, **payload)
+            return result['message_id']
+
+        api_kwargs = {}
+        if 'reply_markup' in payload:
+            api_kwargs['reply_markup'] = json.dumps(payload.pop('reply_markup'))
+        sent = await bot.send_message(chat_id=message.chat_id, api_kwargs=api_kwargs or None, **payload)
+        return sent.message_id
+
+    def _retry(self, message: OutboxMessage, error: str, retry_after=None):
+        if message.attempts >= self.max_attempts:
+            self._fail(message, error)
+            return
+        if retry_after is not None:
+            delay = retry_after if isinstance(retry_after, timedelta) else timedelta(seconds=retry_after)
+        else:
+            delay = retry_delay(message.attempts)
+        message.last_error = error
+        message.next_attempt_at = timezone.now() + delay
+        self.retried += 1
+
+    def _fail(self, message: OutboxMessage, error: str):
+        message.status = OutboxMessage.Status.FAILED
+        message.last_error = error
+        self.dead += 1
+        logger.warning('Сообщение outbox #%s не доставлено (chat=%s): %s', message.id, message.chat_id, error)
+
+    def stats(self) -> dict:
+        stats = {
+            'sent': self.sent,
+            'retried': self.retried,
+            'dead': self.dead,
+        }
+        for name, bot in self.bots.items():
+            if isinstance(bot, telegram_api.AsyncTelegramClient):
+                for method, method_stats in bot.stats().items():
+                    stats[f'{name}.{method}'] = method_stats
+        return stats
+
+
+# Воркер процесса бота
+worker: OutboxWorker | None = None
+
+
+async def start_outbox_worker(application, batch_size: int, lease_seconds: int, poll_interval: float, max_attempts: int):
+    """Запустить воркер: основной бот — application.bot (с лимитером), бонус-бот — клиент core.telegram"""
+    global worker
+    bots = {OutboxMessage.Bot.MAIN: application.bot}
+    if telegram_api.is_configured(telegram_api.BONUS):
+        bots[OutboxMessage.Bot.BONUS] = telegram_api.create_async_client(telegram_api.BONUS)
+
+    worker = OutboxWorker(bots, batch_size, lease_seconds, poll_interval, max_attempts)
+    await worker.start()
+
+
+async def stop_outbox_worker():
+    global worker
+    if worker is None:
+        return
+    await worker.stop()
+    bonus_client = worker.bots.get(OutboxMessage.Bot.BONUS)
+    if bonus_client is not None:
+        await bonus_client.aclose()
+    worker = None
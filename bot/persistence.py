@@ -0,0 +1,163 @@
+import asyncio
+import copy
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Q
+from telegram.ext import BasePersistence, PersistenceInput
+
+from bot.models import BotStateEntry
+
+logger = logging.getLogger(__name__)
+
+_DELETED = object()
+
+
+class DjangoPersistence(BasePersistence):
+    """Хранение user_data и состояний ConversationHandler в PostgreSQL.
+
+    PTB отдаёт изменения раз в update_interval секунд; все изменения
+    одного такого цикла пишутся одной транзакцией. При старте всё
+    читается одним запросом на тип данных.
+    """
+
+    def __init__(self, update_interval: float = 60):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self._user_data: dict[int, dict] | None = None
+        self._conversations: dict[str, dict] = {}
+        self._dirty: dict[tuple[str, str], object] = {}
+        self._flush_task: asyncio.Task | None = None
+
+    # ─── Чтение ──────────────────────────────────────────────────────────
+
+    async def get_user_data(self) -> dict[int, dict]:
+        if self._user_data is None:
+            self._user_data = {
+                int(entry.key): entry.data
+                async for entry in BotStateEntry.objects.filter(kind=BotStateEntry.Kind.USER_DATA)
+            }
+        return copy.deepcopy(self._user_data)
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        if name not in self._conversations:
+            prefix = f'{name}:'
+            self._conversations[name] = {
+                tuple(json.loads(entry.key[len(prefix):])): entry.data['state']
+                async for entry in BotStateEntry.objects.filter(
+                    kind=BotStateEntry.Kind.CONVERSATION,
+                    key__startswith=prefix,
+                )
+            }
+        return dict(self._conversations[name])
+
+    # ─── Запись (буферизуется) ───────────────────────────────────────────
+
+    async def update_conversation(self, name: str, key, new_state):
+        self._conversations.setdefault(name, {})
+        if new_state is None:
+            self._conversations[name].pop(key, None)
+            data = _DELETED
+        else:
+            self._conversations[name][key] = new_state
+            data = {'state': new_state}
+        self._mark_dirty(BotStateEntry.Kind.CONVERSATION, f'{name}:{json.dumps(list(key))}', data)
+
+    async def update_user_data(self, user_id: int, data: dict):
+        if self._user_data is None:
+            self._user_data = {}
+        self._user_data[user_id] = copy.deepcopy(data)
+        self._mark_dirty(BotStateEntry.Kind.USER_DATA, str(user_id), self._user_data[user_id])
+
+    async def drop_user_data(self, user_id: int):
+        if self._user_data is not None:
+            self._user_data.pop(user_id, None)
+        self._mark_dirty(BotStateEntry.Kind.USER_DATA, str(user_id), _DELETED)
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def update_bot_data(self, data: dict):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict):
+        pass
+
+    async def flush(self):
+        """Дописать всё накопленное (при остановке бота)"""
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._write_dirty()
+
+    # ─── Пакетная запись ─────────────────────────────────────────────────
+
+    def _mark_dirty(self, kind: str, key: str, data):
+        self._dirty[(kind, key)] = data
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_soon())
+
+    async def _flush_soon(self):
+        # Даём PTB отдать остальные изменения этого цикла, затем пишем одним пакетом
+        await asyncio.sleep(0)
+        await self._write_dirty()
+
+    async def _write_dirty(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        try:
+            await sync_to_async(_write_entries)(dirty)
+        except Exception:
+            logger.exception('Не удалось сохранить состояние бота (%s записей)', len(dirty))
+            # Вернём в буфер, чтобы записать в следующем цикле
+            for key, data in dirty.items():
+                self._dirty.setdefault(key, data)
+
+
+def _write_entries(dirty: dict):
+    deleted = []
+    entries = []
+    for (kind, key), data in dirty.items():
+        if data is _DELETED:
+            deleted.append(Q(kind=kind, key=key))
+        else:
+            entries.append(BotStateEntry(kind=kind, key=key, data=data))
+
+    with transaction.atomic():
+        if deleted:
+            condition = deleted[0]
+            for q in deleted[1:]:
+                condition |= q
+            BotStateEntry.objects.filter(condition).delete()
+        if entries:
+            BotStateEntry.objects.bulk_create(
+                entries,
+                update_conflicts=True,
+                unique_fields=['kind', 'key'],
+                update_fields=['data', 'updated_at'],
+            )
@@ -0,0 +1,95 @@
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from core.image_utils import compress_image
+
+logger = logging.getLogger(__name__)
+
+
+def _store(full_path: str, data: bytes):
+    """Сжать фото в памяти (JPEG, max 1920px — как загрузки в админке) и записать один раз"""
+    if os.path.exists(full_path):
+        return
+    compressed = compress_image(ContentFile(data, name=os.path.basename(full_path)))
+    if compressed is not None:
+        data = compressed.read()
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    tmp_path = f'{full_path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, full_path)
+
+
+class PhotoIngestor:
+    """Приём скриншотов выкупа.
+
+    Фото скачивается в память, имя файла — хэш содержимого; путь возвращается
+    сразу, а сжатие и единственную запись на диск выполняет фоновый воркер,
+    поэтому ответ пользователю не ждёт ни диска, ни обработки картинки.
+    Повторная отправка того же фото (тот же file_unique_id) не скачивается
+    заново. Очередь в памяти — при остановке бота её дописывает drain().
+    """
+
+    def __init__(self, max_known: int = 10000):
+        self.max_known = max_known
+        self._known: OrderedDict[tuple[int, str], str] = OrderedDict()
+        self._queue: asyncio.Queue[tuple[str, bytes]] = asyncio.Queue()
+        self._queued: set[str] = set()
+        self._worker: asyncio.Task | None = None
+
+    async def ingest(self, photo, buyback_id: int) -> str:
+        """Скачать PhotoSize и поставить в очередь на запись, вернуть путь относительно MEDIA_ROOT"""
+        key = (buyback_id, photo.file_unique_id)
+        file_path = self._known.get(key)
+        if file_path is not None:
+            self._known.move_to_end(key)
+            return file_path
+
+        file = await photo.get_file()
+        data = bytes(await file.download_as_bytearray())
+        digest = hashlib.sha256(data).hexdigest()
+
+        file_path = f'buybacks/{buyback_id}/{digest[:32]}.jpg'
+        self._enqueue(os.path.join(settings.MEDIA_ROOT, file_path), data)
+
+        self._known[key] = file_path
+        if len(self._known) > self.max_known:
+            self._known.popitem(last=False)
+        return file_path
+
+    def _enqueue(self, full_path: str, data: bytes):
+        if full_path in self._queued:
+            return
+        self._queued.add(full_path)
+        self._queue.put_nowait((full_path, data))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while not self._queue.empty():
+            full_path, data = await self._queue.get()
+            try:
+                await asyncio.to_thread(_store, full_path, data)
+            except Exception:
+                logger.exception('Не удалось сохранить фото %s', full_path)
+            finally:
+                self._queued.discard(full_path)
+
+    async def drain(self):
+        """Дописать очередь на диск (при остановке бота)"""
+        if self._worker is not None and not self._worker.done():
+            await self._worker
+        if not self._queue.empty():
+            await self._run()
+
+    def stats(self) -> dict:
+        return {'queued': self._queue.qsize()}
+
+
+photo_ingestor = PhotoIngestor()
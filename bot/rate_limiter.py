@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, запас не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Под замком ожидающие обслуживаются по очереди
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class TelegramRateLimiter(BaseRateLimiter):
+    """Ограничитель исходящих запросов бота под лимиты Telegram.
+
+    Общий token bucket (по умолчанию 30 запросов/с), не чаще per_chat_rate
+    сообщений в секунду в один чат, не больше max_concurrency запросов
+    одновременно. RetryAfter приостанавливает все отправки на указанное
+    время и повторяет запрос; сетевые ошибки повторяются с экспоненциальной
+    задержкой (кроме BadRequest и таймаутов send*, которые могли дойти). Через него идут все вызовы context.bot / application.bot.
+    """
+
+    # Служебные методы без отправки сообщений — не ограничиваем
+    EXEMPT_ENDPOINTS = frozenset({'getUpdates', 'setWebhook', 'deleteWebhook', 'getMe'})
+
+    def __init__(
+        self,
+        global_rate: float = 30,
+        per_chat_rate: float = 1,
+        max_concurrency: int = 8,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+    ):
+        self.global_rate = global_rate
+        self.per_chat_interval = 1 / per_chat_rate
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+
+        self._bucket: TokenBucket | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._chat_next: dict[int | str, float] = {}
+        self._paused_until = 0.0
+
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.retry_after_hits = 0
+
+    async def initialize(self):
+        self._bucket = TokenBucket(self.global_rate)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def shutdown(self):
+        self._chat_next.clear()
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if endpoint in self.EXEMPT_ENDPOINTS:
+            return await callback(*args, **kwargs)
+
+        max_retries = (rate_limit_args or {}).get('max_retries', self.max_retries)
+        chat_id = data.get('chat_id')
+        attempt = 0
+
+        while True:
+            await self._wait_turn(chat_id)
+            try:
+                async with self._semaphore:
+                    result = await callback(*args, **kwargs)
+                self.sent += 1
+                return result
+
+            except RetryAfter as exc:
+                self.retry_after_hits += 1
+                delay = _seconds(exc.retry_after)
+                # Telegram требует паузу — приостанавливаем все отправки
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                if attempt >= max_retries:
+                    self.failed += 1
+                    raise
+                logger.warning('Telegram RetryAfter %.1f с (%s, chat=%s)', delay, endpoint, chat_id)
+
+            except BadRequest:
+                # В PTB BadRequest — подкласс NetworkError; повтор не поможет
+                self.failed += 1
+                raise
+
+            except TimedOut:
+                # Сообщение могло уже дойти — send* не повторяем, чтобы не задвоить
+                if attempt >= max_retries or endpoint.startswith('send'):
+                    self.failed += 1
+                    raise
+                await asyncio.sleep(self.backoff_base * 2 ** attempt)
+
+            except NetworkError:
+                if attempt >= max_retries:
+                    self.failed += 1
+                    raise
+                await asyncio.sleep(self.backoff_base * 2 ** attempt)
+
+            except Exception:
+                self.failed += 1
+                raise
+
+            attempt += 1
+            self.retries += 1
+
+    async def _wait_turn(self, chat_id):
+        """Дождаться глобальной паузы, очереди чата и токена общего лимита"""
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+        if chat_id is not None:
+            now = time.monotonic()
+            slot = max(now, self._chat_next.get(chat_id, 0))
+            self._chat_next[chat_id] = slot + self.per_chat_interval
+            if len(self._chat_next) > 10000:
+                self._prune_chats(now)
+            if slot > now:
+                await asyncio.sleep(slot - now)
+
+        await self._bucket.acquire()
+
+    def _prune_chats(self, now: float):
+        self._chat_next = {chat_id: t for chat_id, t in self._chat_next.items() if t > now}
+
+    def stats(self) -> dict:
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'retries': self.retries,
+            'retry_after': self.retry_after_hits,
+        }
+
+
+def _seconds(value) -> float:
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return float(value)
@@ -1,87 +1,124 @@
+import asyncio
+import logging
 from datetime import timedelta
+
+from asgiref.sync import sync_to_async
 from django.utils import timezone
 from django.conf import settings
 from telegram.ext import ContextTypes
 
 from pipeline.models import Buyback, ReviewReminder
 from pipeline.reminder_service import (
+    advance_reminder,
     create_reminders_for_step,
+    due_stage,
     cancel_reminders_for_buyback,
+    claim_due_reminders,
+    prune_finished_reminders,
     get_reminder_text,
     get_publish_time_display,
 )
+from pipeline.expiry_service import ExpiredBuyback, claim_due_step_reminders, expire_overdue_buybacks
 from steps.models import StepType
+from bot.catalog_cache import catalog_cache
+from bot.identity import identity_cache
+from bot.step_plan import step_plans
+from bot.digest import reminder_digest
+from bot.metrics import metrics
+from bot.scheduler import DeadlineKind, schedule_deadline
+
+logger = logging.getLogger(__name__)
+
+reminder_metrics = metrics.job('check_reminders_job')
+timeout_metrics = metrics.job('check_timeouts_job')
+step_reminder_metrics = metrics.job('check_step_reminders_job')
 
 
 async def check_reminders_job(context: ContextTypes.DEFAULT_TYPE):
-    """Периодическая проверка и отправка напоминаний"""
-    now = timezone.now()
+    """Отправка наступивших напоминаний.
+
+    Напоминания захватываются пачками (SKIP LOCKED + аренда), поэтому
+    несколько экземпляров бота делят работу, не дублируя отправки.
+    Отправки пачки запускаются сразу, без ожидания окна склейки, — цикл
+    захвата не растягивается на (число пачек × окно).
+    """
+    batch_size = settings.BOT_REMINDER_BATCH_SIZE
+    sends: list[asyncio.Task] = []
+    with reminder_metrics.run():
+        try:
+            await claim_and_process_reminders(context, batch_size, sends)
+        finally:
+            await asyncio.gather(*sends)
+
+
+async def claim_and_process_reminders(context: ContextTypes.DEFAULT_TYPE, batch_size: int, sends: list):
+    while True:
+        now = timezone.now()
+        # Берём и те, что наступят в пределах окна склейки, — уйдут одним сообщением
+        ids = await sync_to_async(claim_due_reminders)(
+            batch_size,
+            settings.BOT_REMINDER_LEASE_SECONDS,
+            now,
+            due_before=now + timedelta(seconds=reminder_digest.window),
+        )
+        reminder_metrics.scanned += len(ids)
+        if not ids:
+            return
+
+        sends.extend(await process_reminders(context, ids, now))
+
+        if len(ids) < batch_size:
+            return
 
-    # Получаем напоминания которые пора отправить
-    reminders = ReviewReminder.objects.filter(
-        sent_at__isnull=True,
-        is_cancelled=False,
-        scheduled_at__lte=now,
-    ).select_related(
+
+async def process_reminders(context: ContextTypes.DEFAULT_TYPE, ids: list[int], now) -> list[asyncio.Task]:
+    """Обработать захваченные напоминания; возвращает запущенные отправки"""
+    reminders = ReviewReminder.objects.filter(id__in=ids).select_related(
         'buyback__user',
         'buyback__task',
         'step',
     )
 
+    sends = []
+    stale = []
     async for reminder in reminders:
         buyback = reminder.buyback
 
-        # Проверяем статус выкупа
-        if buyback.status != Buyback.Status.IN_PROGRESS:
-            reminder.is_cancelled = True
-            await reminder.asave(update_fields=['is_cancelled'])
+        # Выкуп ушёл со шага (завершённые отменяются сразу при переходе, здесь — остальное)
+        if buyback.status != Buyback.Status.IN_PROGRESS or buyback.current_step != reminder.step.order:
+            stale.append(reminder.id)
             continue
 
-        # Проверяем что на нужном шаге
-        if buyback.current_step != reminder.step.order:
-            reminder.is_cancelled = True
-            await reminder.asave(update_fields=['is_cancelled'])
-            continue
+        reminder_metrics.acted += 1
+        reminder_metrics.observe_lag(reminder.scheduled_at, now)
+        sends.append(asyncio.create_task(send_review_reminder(context.bot, reminder, now)))
 
-        # Для OVERDUE — проверяем лимит
-        if reminder.reminder_type == ReviewReminder.ReminderType.OVERDUE:
-            if reminder.overdue_count >= 5:
-                reminder.is_cancelled = True
-                await reminder.asave(update_fields=['is_cancelled'])
-                continue
+    if stale:
+        await ReviewReminder.objects.filter(id__in=stale).aupdate(is_cancelled=True)
 
-        # Отправляем
-        chat_id = buyback.user.telegram_id
-        text = get_reminder_text(reminder, reminder.step, buyback)
+    # Отправки идут параллельно, темп задаёт TelegramRateLimiter бота
+    return sends
 
-        try:
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text=text,
-                parse_mode='HTML',
-            )
-            print(f'[REMINDER] Sent {reminder.reminder_type} to {chat_id}')
 
-            reminder.sent_at = now
+async def send_review_reminder(bot, reminder: ReviewReminder, now):
+    buyback = reminder.buyback
+    chat_id = buyback.user.telegram_id
+    stage = due_stage(reminder, now)
+    reminder.reminder_type = stage
+    text = get_reminder_text(reminder, reminder.step, buyback)
 
-            # Для OVERDUE — создаём следующее
-            if reminder.reminder_type == ReviewReminder.ReminderType.OVERDUE:
-                reminder.overdue_count += 1
-                await reminder.asave(update_fields=['sent_at', 'overdue_count'])
+    ok = await reminder_digest.send(bot, chat_id, text)
+    reminder_metrics.record_send(ok)
+    if not ok:
+        return
 
-                if reminder.overdue_count < 5:
-                    await ReviewReminder.objects.acreate(
-                        buyback=buyback,
-                        step=reminder.step,
-                        reminder_type=ReviewReminder.ReminderType.OVERDUE,
-                        scheduled_at=now + timedelta(hours=2),
-                        overdue_count=reminder.overdue_count,
-                    )
-            else:
-                await reminder.asave(update_fields=['sent_at'])
+    logger.info('Напоминание %s отправлено (chat=%s)', stage, chat_id)
 
-        except Exception as e:
-            print(f'[REMINDER] Error sending to {chat_id}: {e}')
+    # Сдвигаем курсор расписания на следующий этап
+    advance_reminder(reminder, stage, now)
+    await reminder.asave(update_fields=['reminder_type', 'scheduled_at', 'sent_at', 'overdue_count', 'locked_until'])
+    if reminder.scheduled_at:
+        schedule_deadline(reminder.scheduled_at, DeadlineKind.REMINDER, buyback.id)
 
 
 async def schedule_publish_review_reminders(application, buyback: Buyback, step):
@@ -93,8 +130,9 @@ async def schedule_publish_review_reminders(application, buyback: Buyback, step)
         return
 
     # Создаём напоминания в БД
-    from asgiref.sync import sync_to_async
-    await sync_to_async(create_reminders_for_step)(buyback, step)
+    reminder = await sync_to_async(create_reminders_for_step)(buyback, step)
+    if reminder:
+        schedule_deadline(reminder.scheduled_at, DeadlineKind.REMINDER, buyback.id)
 
     # Отправляем первое сообщение
     chat_id = buyback.user.telegram_id
@@ -114,83 +152,79 @@ async def schedule_publish_review_reminders(application, buyback: Buyback, step)
             text=text,
             parse_mode='HTML',
         )
-    except Exception as e:
-        print(f'[REMINDER] Error sending initial message: {e}')
+    except Exception:
+        logger.exception('Не удалось отправить сообщение о публикации отзыва (chat=%s)', chat_id)
 
 
 async def cancel_buyback_reminders(application, buyback: Buyback):
     """Отменить все напоминания при завершении шага"""
-    from asgiref.sync import sync_to_async
     await sync_to_async(cancel_reminders_for_buyback)(buyback)
 
 
-async def check_timeouts_job(context: ContextTypes.DEFAULT_TYPE):
-    """Периодическая проверка таймаутов шагов — помечаем как EXPIRED"""
-    from steps.models import TaskStep
+async def expire_buybacks(buyback_ids=None) -> list[ExpiredBuyback]:
+    """Истечь просроченные выкупы (все или указанные) и сбросить их кэши в боте"""
+    expired = await sync_to_async(expire_overdue_buybacks)(buyback_ids=buyback_ids)
+    if expired:
+        catalog_cache.invalidate()
+        for row in expired:
+            identity_cache.invalidate_user(row.user_id)
+    return expired
 
-    buybacks = Buyback.objects.filter(
-        status=Buyback.Status.IN_PROGRESS,
-        step_started_at__isnull=False,
-    ).select_related('user', 'task')
 
-    async for buyback in buybacks:
-        step = await TaskStep.objects.filter(
-            task_id=buyback.task_id,
-            order=buyback.current_step,
-        ).afirst()
-
-        if not step or not step.timeout_minutes:
-            continue
-
-        deadline = buyback.step_started_at + timedelta(minutes=step.timeout_minutes)
-        if timezone.now() <= deadline:
-            continue
+async def notify_buyback_expired(bot, row: ExpiredBuyback):
+    try:
+        await bot.send_message(
+            chat_id=row.telegram_id,
+            text=(
+                f'⏰ <b>Время истекло!</b>\n\n'
+                f'Задание «{row.task_title}» отменено — '
+                f'шаг не выполнен за {row.timeout_minutes} мин.'
+            ),
+            parse_mode='HTML',
+        )
+    except Exception:
+        logger.exception('Не удалось уведомить об истечении выкупа #%s (chat=%s)', row.id, row.telegram_id)
+        timeout_metrics.record_send(False)
+        return
+    timeout_metrics.record_send(True)
 
-        # Таймаут истёк
-        buyback.status = Buyback.Status.EXPIRED
-        await buyback.asave(update_fields=['status'])
 
-        try:
-            await context.bot.send_message(
-                chat_id=buyback.user.telegram_id,
-                text=(
-                    f'⏰ <b>Время истекло!</b>\n\n'
-                    f'Задание «{buyback.task.title}» отменено — '
-                    f'шаг не выполнен за {step.timeout_minutes} мин.'
-                ),
-                parse_mode='HTML',
-            )
-            print(f'[TIMEOUT] Buyback #{buyback.id} expired')
-        except Exception as e:
-            print(f'[TIMEOUT] Error notifying {buyback.user.telegram_id}: {e}')
+async def check_timeouts_job(context: ContextTypes.DEFAULT_TYPE):
+    """Проверка таймаутов шагов: все просроченные выкупы истекают одним UPDATE,
+    уведомления рассылаются параллельно"""
+    with timeout_metrics.run():
+        now = timezone.now()
+        expired = await expire_buybacks()
+        # UPDATE ... RETURNING возвращает только истёкшие строки: выбрано = обработано
+        timeout_metrics.scanned += len(expired)
+        timeout_metrics.acted += len(expired)
+        for row in expired:
+            timeout_metrics.observe_lag(row.step_deadline_at, now)
+        if expired:
+            await asyncio.gather(*(notify_buyback_expired(context.bot, row) for row in expired))
 
 
 async def check_step_reminders_job(context: ContextTypes.DEFAULT_TYPE):
-    """Периодическая отправка напоминаний по шагам (reminder_minutes)"""
-    from steps.models import TaskStep
-
-    buybacks = Buyback.objects.filter(
-        status=Buyback.Status.IN_PROGRESS,
-        step_started_at__isnull=False,
-        reminder_sent=False,
-    ).select_related('user', 'task')
+    """Отправка напоминаний по шагам (reminder_minutes)"""
+    with step_reminder_metrics.run():
+        await send_due_step_reminders(context)
 
-    async for buyback in buybacks:
-        step = await TaskStep.objects.filter(
-            task_id=buyback.task_id,
-            order=buyback.current_step,
-        ).afirst()
 
+async def send_due_step_reminders(context: ContextTypes.DEFAULT_TYPE):
+    now = timezone.now()
+    # Захват одним UPDATE — напоминание отправит только один экземпляр бота
+    due = await sync_to_async(claim_due_step_reminders)(now + timedelta(seconds=reminder_digest.window))
+    step_reminder_metrics.scanned += len(due)
+
+    sends = []
+    for row in due:
+        plan = await step_plans.aget_version(row.task_id, row.steps_version)
+        step = plan.get(row.current_step)
         if not step or not step.reminder_minutes:
             continue
 
-        remind_at = buyback.step_started_at + timedelta(minutes=step.reminder_minutes)
-        if timezone.now() < remind_at:
-            continue
-
-        # Пора напомнить
-        buyback.reminder_sent = True
-        await buyback.asave(update_fields=['reminder_sent'])
+        step_reminder_metrics.acted += 1
+        step_reminder_metrics.observe_lag(row.step_remind_at, now)
 
         # Формируем текст
         if step.reminder_text:
@@ -201,25 +235,34 @@ async def check_step_reminders_job(context: ContextTypes.DEFAULT_TYPE):
                     remaining = f'{left} мин'
             text = step.reminder_text.format(
                 remaining_time=remaining,
-                task_title=buyback.task.title,
+                task_title=row.task_title,
                 step_title=step.title or f'Шаг {step.order}',
             )
         else:
             text = (
                 f'⏰ <b>Напоминание</b>\n\n'
-                f'Не забудь выполнить шаг в задании «{buyback.task.title}».'
+                f'Не забудь выполнить шаг в задании «{row.task_title}».'
             )
             if step.timeout_minutes:
                 left = step.timeout_minutes - step.reminder_minutes
                 if left > 0:
                     text += f'\nОсталось времени: {left} мин.'
 
-        try:
-            await context.bot.send_message(
-                chat_id=buyback.user.telegram_id,
-                text=text,
-                parse_mode='HTML',
-            )
-            print(f'[STEP_REMINDER] Sent to {buyback.user.telegram_id} for buyback #{buyback.id}')
-        except Exception as e:
-            print(f'[STEP_REMINDER] Error: {e}')
\ No newline at end of file
+        sends.append(send_step_reminder(context.bot, row.telegram_id, text))
+
+    await asyncio.gather(*sends)
+
+
+async def send_step_reminder(bot, chat_id: int, text: str):
+    ok = await reminder_digest.send(bot, chat_id, text)
+    step_reminder_metrics.record_send(ok)
+
+
+async def prune_reminders_job(context: ContextTypes.DEFAULT_TYPE):
+    """Периодическая очистка завершённых напоминаний"""
+    deleted = await sync_to_async(prune_finished_reminders)(
+        settings.REMINDER_RETENTION_DAYS,
+        settings.REMINDER_PRUNE_CHUNK_SIZE,
+    )
+    if deleted:
+        logger.info('Удалено завершённых напоминаний: %s', deleted)
@@ -0,0 +1,256 @@
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from pipeline.models import Buyback, ReviewReminder
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineKind:
+    """Типы дедлайнов"""
+    REMINDER = 'reminder'
+    TIMEOUT = 'timeout'
+    STEP_REMINDER = 'step_reminder'
+
+
+class DeadlineScheduler:
+    """Единый планировщик дедлайнов бота.
+
+    Куча (fire_at, kind, buyback_id) загружается из БД при старте, пополняется
+    из обработчиков бота и спит до ближайшего дедлайна. При срабатывании
+    вызывается задача соответствующего типа — она сама выбирает из БД всё,
+    что уже пора обработать. Дедлайны из процесса бэкофиса (модерация)
+    подхватывает догоняющая проверка раз в catchup_interval: короткие
+    запросы по частичным индексам сроков, наступающих до следующей проверки.
+    Полная пересинхронизация раз в resync_interval снимает отменённые
+    и перенесённые дедлайны.
+
+    Задачи запускаются отдельными asyncio-задачами, цикл их не ждёт: долгая
+    отправка напоминаний не задерживает таймауты. Задача одного типа не
+    запускается параллельно сама с собой — срабатывание во время прогона
+    даёт один повторный прогон после него.
+    """
+
+    def __init__(self, application, jobs: dict, resync_interval: float, catchup_interval: float):
+        self.application = application
+        self.jobs = jobs
+        self.resync_interval = resync_interval
+        self.catchup_interval = catchup_interval
+        self._heap: list[tuple[datetime, str, int]] = []
+        self._entries: dict[tuple[str, int], set[datetime]] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._running: dict[str, asyncio.Task] = {}
+        self._rerun: set[str] = set()
+
+    # ─── Управление дедлайнами ───────────────────────────────────────────
+
+    def schedule(self, fire_at: datetime, kind: str, buyback_id: int):
+        fire_times = self._entries.setdefault((kind, buyback_id), set())
+        if fire_at in fire_times:
+            return
+        fire_times.add(fire_at)
+        heapq.heappush(self._heap, (fire_at, kind, buyback_id))
+        self._wakeup.set()
+
+    def cancel(self, buyback_id: int, kinds=None):
+        """Снять дедлайны выкупа (записи в куче пропускаются лениво)"""
+        for kind in kinds or (DeadlineKind.REMINDER, DeadlineKind.TIMEOUT, DeadlineKind.STEP_REMINDER):
+            self._entries.pop((kind, buyback_id), None)
+
+    def _pop_due(self, now: datetime) -> set[str]:
+        kinds = set()
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, kind, buyback_id = heapq.heappop(self._heap)
+            fire_times = self._entries.get((kind, buyback_id))
+            if not fire_times or fire_at not in fire_times:
+                continue
+            fire_times.discard(fire_at)
+            if not fire_times:
+                del self._entries[(kind, buyback_id)]
+            kinds.add(kind)
+        return kinds
+
+    def _seconds_to_next(self, now: datetime) -> float | None:
+        if not self._heap:
+            return None
+        return max((self._heap[0][0] - now).total_seconds(), 0)
+
+    def stats(self) -> dict:
+        return {
+            'pending': sum(len(fire_times) for fire_times in self._entries.values()),
+            'heap': len(self._heap),
+            'running': len(self._running),
+        }
+
+    # ─── Загрузка из БД ──────────────────────────────────────────────────
+
+    async def load(self):
+        """Пересобрать кучу по текущему состоянию БД"""
+        heap = []
+        entries: dict[tuple[str, int], set[datetime]] = {}
+
+        def add(fire_at, kind, buyback_id):
+            entries.setdefault((kind, buyback_id), set()).add(fire_at)
+            heap.append((fire_at, kind, buyback_id))
+
+        reminders = ReviewReminder.objects.filter(
+            scheduled_at__isnull=False,
+            is_cancelled=False,
+        ).values_list('scheduled_at', 'buyback_id')
+        async for scheduled_at, buyback_id in reminders:
+            add(scheduled_at, DeadlineKind.REMINDER, buyback_id)
+
+        deadlines = Buyback.objects.filter(
+            status=Buyback.Status.IN_PROGRESS,
+        ).filter(
+            Q(step_deadline_at__isnull=False) | Q(step_remind_at__isnull=False),
+        ).values_list('id', 'step_deadline_at', 'step_remind_at')
+        async for buyback_id, deadline_at, remind_at in deadlines:
+            if deadline_at:
+                add(deadline_at, DeadlineKind.TIMEOUT, buyback_id)
+            if remind_at:
+                add(remind_at, DeadlineKind.STEP_REMINDER, buyback_id)
+
+        heapq.heapify(heap)
+        self._heap = heap
+        self._entries = entries
+        self._wakeup.set()
+
+    async def catch_up(self):
+        """Добавить дедлайны, наступающие до следующей проверки (повторы schedule отбрасывает)"""
+        horizon = timezone.now() + timedelta(seconds=self.catchup_interval)
+
+        reminders = ReviewReminder.objects.filter(
+            scheduled_at__lte=horizon,
+            is_cancelled=False,
+        ).values_list('scheduled_at', 'buyback_id')
+        async for scheduled_at, buyback_id in reminders:
+            self.schedule(scheduled_at, DeadlineKind.REMINDER, buyback_id)
+
+        timeouts = Buyback.objects.filter(
+            status=Buyback.Status.IN_PROGRESS,
+            step_deadline_at__lte=horizon,
+        ).values_list('step_deadline_at', 'id')
+        async for deadline_at, buyback_id in timeouts:
+            self.schedule(deadline_at, DeadlineKind.TIMEOUT, buyback_id)
+
+        step_reminders = Buyback.objects.filter(
+            status=Buyback.Status.IN_PROGRESS,
+            step_remind_at__lte=horizon,
+        ).values_list('step_remind_at', 'id')
+        async for remind_at, buyback_id in step_reminders:
+            self.schedule(remind_at, DeadlineKind.STEP_REMINDER, buyback_id)
+
+    # ─── Цикл ────────────────────────────────────────────────────────────
+
+    def _fire(self, kinds: set[str]):
+        # Задачи разных типов идут параллельно — их напоминания попадают в одно окно склейки
+        loop = asyncio.get_running_loop()
+        for kind in kinds:
+            if kind in self._running:
+                self._rerun.add(kind)
+                continue
+            task = loop.create_task(self._run_job(kind))
+            self._running[kind] = task
+            task.add_done_callback(lambda _, kind=kind: self._running.pop(kind, None))
+
+    async def _run_job(self, kind: str):
+        while True:
+            self._rerun.discard(kind)
+            context = self.application.context_types.context(application=self.application)
+            try:
+                await self.jobs[kind](context)
+            except Exception:
+                logger.exception('Ошибка задачи планировщика %s', kind)
+            if kind not in self._rerun:
+                return
+
+    async def _run(self):
+        next_resync = time.monotonic() + self.resync_interval
+        next_catchup = time.monotonic() + self.catchup_interval
+        while True:
+            self._wakeup.clear()
+
+            due = self._pop_due(timezone.now())
+            if due:
+                self._fire(due)
+
+            timeout = max(min(next_resync, next_catchup) - time.monotonic(), 0)
+            to_next = self._seconds_to_next(timezone.now())
+            if to_next is not None:
+                timeout = min(timeout, to_next)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            if time.monotonic() >= next_resync:
+                try:
+                    await self.load()
+                except Exception:
+                    logger.exception('Не удалось пересинхронизировать дедлайны')
+                next_resync = time.monotonic() + self.resync_interval
+                next_catchup = time.monotonic() + self.catchup_interval
+            elif time.monotonic() >= next_catchup:
+                try:
+                    await self.catch_up()
+                except Exception:
+                    logger.exception('Не удалось проверить новые дедлайны')
+                next_catchup = time.monotonic() + self.catchup_interval
+
+    async def start(self):
+        await self.load()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        tasks = [task for task in (self._task, *self._running.values()) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._running.clear()
+        self._rerun.clear()
+
+
+# Планировщик процесса бота (в процессе бэкофиса — None)
+scheduler: DeadlineScheduler | None = None
+
+
+def schedule_deadline(fire_at: datetime, kind: str, buyback_id: int):
+    if scheduler is not None:
+        scheduler.schedule(fire_at, kind, buyback_id)
+
+
+def cancel_deadlines(buyback_id: int, kinds=None):
+    if scheduler is not None:
+        scheduler.cancel(buyback_id, kinds)
+
+
+def schedule_step_deadlines(buyback: Buyback):
+    """Дедлайны нового шага: таймаут и напоминание (из полей выкупа)"""
+    cancel_deadlines(buyback.id, (DeadlineKind.TIMEOUT, DeadlineKind.STEP_REMINDER))
+    if buyback.step_deadline_at:
+        schedule_deadline(buyback.step_deadline_at, DeadlineKind.TIMEOUT, buyback.id)
+    if buyback.step_remind_at:
+        schedule_deadline(buyback.step_remind_at, DeadlineKind.STEP_REMINDER, buyback.id)
+
+
+async def start_scheduler(application, jobs: dict, resync_interval: float, catchup_interval: float):
+    global scheduler
+    scheduler = DeadlineScheduler(application, jobs, resync_interval, catchup_interval)
+    await scheduler.start()
+
+
+async def stop_scheduler():
+    global scheduler
+    if scheduler is not None:
+        await scheduler.stop()
+        scheduler = None
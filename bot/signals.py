@@ -0,0 +1,71 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from account.models import TelegramUser
+from catalog.models import Product, Task
+from pipeline.lifecycle import buyback_finished
+from pipeline.models import Buyback
+from steps.models import TaskStep
+from .catalog_cache import catalog_cache
+from .identity import identity_cache
+from .scheduler import cancel_deadlines
+from .step_plan import step_plans
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=TaskStep)
+@receiver(post_delete, sender=TaskStep)
+def on_catalog_changed(sender, **kwargs):
+    """Изменился каталог — сбрасываем кэш"""
+    catalog_cache.invalidate()
+
+
+@receiver(post_save, sender=TaskStep)
+@receiver(post_delete, sender=TaskStep)
+def on_task_step_changed(sender, instance, **kwargs):
+    """План шагов пересоберётся и по версии, но в этом процессе сбрасываем сразу"""
+    step_plans.invalidate(instance.task_id)
+
+
+@receiver(post_save, sender=Buyback)
+def on_buyback_status_saved(sender, instance, created, update_fields=None, **kwargs):
+    """Переход выкупа меняет остаток товара"""
+    if created or instance._original_status != instance.status:
+        if update_fields is None or 'status' in update_fields:
+            catalog_cache.invalidate()
+
+
+@receiver(post_save, sender=Buyback)
+def on_buyback_saved(sender, instance, created, **kwargs):
+    """Запись выкупа (шаг, таймеры, статус) обновляет кэш активного выкупа на месте"""
+    plan = step_plans.peek(instance.task_id)
+    step = plan.get(instance.current_step) if plan is not None else None
+    identity_cache.refresh_buyback(instance, step, created=created)
+
+
+@receiver(post_delete, sender=Buyback)
+def on_buyback_deleted(sender, instance, **kwargs):
+    identity_cache.invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=TelegramUser)
+def on_telegram_user_changed(sender, instance, **kwargs):
+    identity_cache.refresh_user(instance)
+
+
+@receiver(post_save, sender=Buyback)
+def on_buyback_left_in_progress(sender, instance, created, update_fields=None, **kwargs):
+    """Выкуп вышел из IN_PROGRESS — его дедлайны в планировщике больше не нужны"""
+    if created or (update_fields is not None and 'status' not in update_fields):
+        return
+    if instance._original_status == Buyback.Status.IN_PROGRESS and instance.status != Buyback.Status.IN_PROGRESS:
+        cancel_deadlines(instance.id)
+
+
+@receiver(buyback_finished)
+def on_buybacks_finished(sender, buyback_ids, **kwargs):
+    for buyback_id in buyback_ids:
+        cancel_deadlines(buyback_id)
@@ -0,0 +1,183 @@
+import asyncio
+from types import MappingProxyType
+
+from catalog.models import Task
+from steps.models import TaskStep
+
+
+def _freeze(value):
+    """Копия JSON-настроек только для чтения (dict → mappingproxy, list → tuple)"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class CompiledStep:
+    """Шаг задания в плане: поля TaskStep и разобранные settings, только чтение.
+
+    Общий для всех обработчиков; изменить можно только через replace(),
+    который возвращает новый объект.
+    """
+
+    __slots__ = (
+        'id', 'task_id', 'order', 'title', 'step_type', 'instruction',
+        'image_name', 'image_path', 'image_file_id', 'publish_time',
+        'timeout_minutes', 'reminder_minutes', 'reminder_text', 'requires_moderation',
+        'settings', 'choices', 'correct_article', 'min_length',
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields[name])
+
+    @classmethod
+    def from_model(cls, step: TaskStep) -> 'CompiledStep':
+        settings = _freeze(step.settings or {})
+        return cls(
+            id=step.id,
+            task_id=step.task_id,
+            order=step.order,
+            title=step.title,
+            step_type=step.step_type,
+            instruction=step.instruction,
+            image_name=step.image.name if step.image else '',
+            image_path=step.image.path if step.image else '',
+            image_file_id=step.image_file_id,
+            publish_time=step.publish_time,
+            timeout_minutes=step.timeout_minutes,
+            reminder_minutes=step.reminder_minutes,
+            reminder_text=step.reminder_text,
+            requires_moderation=step.requires_moderation,
+            settings=settings,
+            choices=step.choices,
+            correct_article=step.correct_article,
+            min_length=step.min_length,
+        )
+
+    def replace(self, **changes) -> 'CompiledStep':
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return type(self)(**fields)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CompiledStep is immutable')
+
+    def __repr__(self):
+        return f'<CompiledStep task={self.task_id} order={self.order} {self.step_type}>'
+
+
+class StepPlan:
+    """Скомпилированный план шагов задания (неизменяемый).
+
+    Шаги (CompiledStep) упорядочены по order, навигация — поиск в словаре
+    без запросов к БД.
+    """
+
+    __slots__ = ('task_id', 'version', 'steps', '_by_order', '_by_id', '_next')
+
+    def __init__(self, task_id: int, version: int, steps):
+        steps = tuple(sorted(steps, key=lambda step: step.order))
+        set_attr = object.__setattr__
+        set_attr(self, 'task_id', task_id)
+        set_attr(self, 'version', version)
+        set_attr(self, 'steps', steps)
+        set_attr(self, '_by_order', {step.order: step for step in steps})
+        set_attr(self, '_by_id', {step.id: step for step in steps})
+        set_attr(self, '_next', {
+            step.order: (steps[i + 1] if i + 1 < len(steps) else None)
+            for i, step in enumerate(steps)
+        })
+
+    def __setattr__(self, name, value):
+        raise AttributeError('StepPlan is immutable')
+
+    @property
+    def total(self) -> int:
+        return len(self.steps)
+
+    def first(self) -> CompiledStep | None:
+        return self.steps[0] if self.steps else None
+
+    def get(self, order: int) -> CompiledStep | None:
+        """Шаг по порядковому номеру"""
+        return self._by_order.get(order)
+
+    def get_by_id(self, step_id: int) -> CompiledStep | None:
+        return self._by_id.get(step_id)
+
+    def next_after(self, order: int) -> CompiledStep | None:
+        """Следующий шаг после order (order может отсутствовать в плане)"""
+        if order in self._next:
+            return self._next[order]
+        for step in self.steps:
+            if step.order > order:
+                return step
+        return None
+
+
+class StepPlanCache:
+    """Кэш планов шагов по (task_id, steps_version)"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._plans: dict[int, StepPlan] = {}
+        self._lock = asyncio.Lock()
+
+    async def aget(self, task: Task) -> StepPlan:
+        """План для задания; версия берётся из уже загруженной строки Task"""
+        return await self.aget_version(task.id, task.steps_version)
+
+    async def aget_version(self, task_id: int, version: int) -> StepPlan:
+        """План по task_id и steps_version (когда строка Task не загружалась)"""
+        plan = self._plans.get(task_id)
+        if plan is not None and plan.version == version:
+            self.hits += 1
+            return plan
+
+        async with self._lock:
+            plan = self._plans.get(task_id)
+            if plan is not None and plan.version == version:
+                self.hits += 1
+                return plan
+
+            self.misses += 1
+            steps = [
+                CompiledStep.from_model(step)
+                async for step in TaskStep.objects.filter(task_id=task_id).order_by('order')
+            ]
+            plan = StepPlan(task_id, version, steps)
+            self._plans[task_id] = plan
+            return plan
+
+    def peek(self, task_id: int) -> StepPlan | None:
+        """Уже собранный план без обращения к БД (для синхронных сигналов)"""
+        return self._plans.get(task_id)
+
+    def set_image_file_id(self, step: CompiledStep, file_id: str):
+        """Запомнить file_id картинки шага: план заменяется новым, старый не меняется"""
+        plan = self._plans.get(step.task_id)
+        if plan is None or plan.get_by_id(step.id) is None:
+            return
+        current = plan.get_by_id(step.id)
+        if current.image_name != step.image_name:
+            return
+        self._plans[step.task_id] = StepPlan(plan.task_id, plan.version, [
+            current.replace(image_file_id=file_id) if item.id == step.id else item
+            for item in plan.steps
+        ])
+
+    def invalidate(self, task_id: int):
+        self._plans.pop(task_id, None)
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._plans),
+        }
+
+
+step_plans = StepPlanCache()
@@ -1,3 +1,82 @@
-from django.test import TestCase
+import asyncio
+import json
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from .concurrency import AdmissionQueue
+from .webhook import TelegramWebhookApp
+
+
+class AdmissionQueueTests(SimpleTestCase):
+    """Предел считается по принятым, но не обработанным апдейтам"""
+
+    async def test_taken_but_unfinished_updates_keep_queue_full(self):
+        queue = AdmissionQueue(maxsize=2)
+        queue.put_nowait(1)
+        queue.put_nowait(2)
+        # Application забрал оба апдейта, но ещё обрабатывает их
+        await queue.get()
+        await queue.get()
+
+        self.assertEqual(queue.in_flight, 2)
+        with self.assertRaises(asyncio.QueueFull):
+            queue.put_nowait(3)
+
+        queue.task_done()
+        queue.put_nowait(3)
+        self.assertEqual(queue.in_flight, 2)
+
+    async def test_put_waits_for_processed_update(self):
+        queue = AdmissionQueue(maxsize=1)
+        queue.put_nowait(1)
+        await queue.get()
+
+        put = asyncio.create_task(queue.put(2))
+        await asyncio.sleep(0)
+        self.assertFalse(put.done())
+
+        queue.task_done()
+        await asyncio.wait_for(put, timeout=1)
+        self.assertEqual(queue.qsize(), 1)
+
+
+@override_settings(BOT_WEBHOOK_URL='https://example.com/bot/webhook/', BOT_WEBHOOK_SECRET='secret')
+class WebhookAdmissionTests(SimpleTestCase):
+    """Webhook отклоняет апдейты, пока принятая работа не обработана"""
+
+    def setUp(self):
+        self.queue = AdmissionQueue(maxsize=2)
+        self.app = TelegramWebhookApp(django_app=None)
+        self.app.application = SimpleNamespace(bot=None, update_queue=self.queue)
+
+    async def _post(self, update_id: int) -> int:
+        body = json.dumps({'update_id': update_id}).encode()
+        scope = {
+            'type': 'http',
+            'method': 'POST',
+            'path': '/bot/webhook/',
+            'headers': [(b'x-telegram-bot-api-secret-token', b'secret')],
+        }
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            sent.append(message)
+
+        await self.app(scope, receive, send)
+        return sent[0]['status']
+
+    async def test_rejects_past_limit_under_load(self):
+        self.assertEqual(await self._post(1), 200)
+        self.assertEqual(await self._post(2), 200)
+        # Application разобрал очередь и обрабатывает оба апдейта
+        await self.queue.get()
+        await self.queue.get()
+
+        self.assertEqual(await self._post(3), 503)
+
+        self.queue.task_done()
+        self.assertEqual(await self._post(4), 200)
@@ -0,0 +1,148 @@
+import asyncio
+import hmac
+import json
+import logging
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class TelegramWebhookApp:
+    """ASGI-обёртка над Django: апдейты Telegram на пути BOT_WEBHOOK_URL
+    кладутся в очередь Application бота, остальные запросы уходят в Django.
+
+    Бот (обработчики и периодические задачи) запускается в lifespan,
+    поэтому ASGI-сервер должен работать с одним воркером.
+    """
+
+    def __init__(self, django_app):
+        if not settings.BOT_WEBHOOK_SECRET:
+            raise ImproperlyConfigured('BOT_WEBHOOK_SECRET is required when BOT_WEBHOOK_URL is set')
+
+        self.django_app = django_app
+        self.url = settings.BOT_WEBHOOK_URL
+        self.path = urlparse(self.url).path.rstrip('/') or '/'
+        self.secret = settings.BOT_WEBHOOK_SECRET
+        self.application = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+
+        if scope['type'] == 'http' and (scope['path'].rstrip('/') or '/') == self.path:
+            await self._handle_update(scope, receive, send)
+            return
+
+        await self.django_app(scope, receive, send)
+
+    # ─── Lifespan ────────────────────────────────────────────────────────
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self._startup()
+                except Exception as e:
+                    logger.exception('Не удалось запустить бота')
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self._shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _startup(self):
+        from bot.application import build_application
+
+        application = build_application()
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await application.bot.set_webhook(
+            url=self.url,
+            secret_token=self.secret,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        self.application = application
+        logger.info('Бот запущен в режиме webhook: %s', self.url)
+
+    async def _shutdown(self):
+        application, self.application = self.application, None
+        if application is None:
+            return
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+    # ─── Приём апдейтов ──────────────────────────────────────────────────
+
+    async def _handle_update(self, scope, receive, send):
+        if scope['method'] != 'POST':
+            await _respond(send, 405)
+            return
+
+        # Сравниваем байты: str с не-ASCII символами compare_digest не принимает
+        headers = dict(scope['headers'])
+        token = headers.get(b'x-telegram-bot-api-secret-token', b'')
+        if not hmac.compare_digest(token, self.secret.encode()):
+            await _respond(send, 403)
+            return
+
+        if self.application is None:
+            await _respond(send, 503)
+            return
+
+        body = await _read_body(receive)
+        if body is None:
+            await _respond(send, 413)
+            return
+
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except Exception:
+            logger.warning('Некорректный апдейт от Telegram')
+            await _respond(send, 400)
+            return
+
+        try:
+            self.application.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Принято max_pending необработанных апдейтов — Telegram повторит доставку позже
+            logger.warning('Очередь апдейтов переполнена, update_id=%s отклонён', update.update_id)
+            await _respond(send, 503)
+            return
+
+        await _respond(send, 200)
+
+
+async def _read_body(receive) -> bytes | None:
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if len(body) > MAX_BODY_SIZE:
+            return None
+        if not message.get('more_body'):
+            return body
+
+
+async def _respond(send, status: int):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'text/plain')],
+    })
+    await send({'type': 'http.response.body', 'body': b''})
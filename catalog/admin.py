@@ -27,13 +27,14 @@ class ProductAdmin(admin.ModelAdmin):
         'price',
         'quantity_total',
         'quantity_completed',
+        'quantity_reserved',
         'limit_per_user',
         'is_active',
     ]
     list_filter = ['is_active', 'created_at']
     search_fields = ['name', 'wb_article']
     list_editable = ['price', 'quantity_total', 'is_active']
-    readonly_fields = ['quantity_completed', 'created_at', 'updated_at']
+    readonly_fields = ['quantity_completed', 'quantity_reserved', 'created_at', 'updated_at']
 
 
 @admin.register(Task)
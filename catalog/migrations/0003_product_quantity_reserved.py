@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-17 10:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill(apps, schema_editor):
+    """Fill quantity_reserved from in-flight buybacks."""
+    Product = apps.get_model('catalog', 'Product')
+    Buyback = apps.get_model('pipeline', 'Buyback')
+    reserved = Buyback.objects.filter(
+        task__product=OuterRef('pk'),
+        status__in=['in_progress', 'on_moderation', 'pending_review'],
+    ).values('task__product').annotate(total=Count('pk')).values('total')
+    Product.objects.update(quantity_reserved=Coalesce(Subquery(reserved), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_alter_product_limit_per_user_days_and_more'),
+        ('pipeline', '0004_custom_publish_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='quantity_reserved',
+            field=models.PositiveIntegerField(default=0, help_text='Выкупы в процессе, на модерации и на проверке (обновляется автоматически)', verbose_name='В работе'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_product_quantity_reserved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='steps_version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Увеличивается при любом изменении шагов задания', verbose_name='Версия шагов'),
+        ),
+    ]
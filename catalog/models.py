@@ -40,6 +40,11 @@ class Product(models.Model):
         'Выкуплено',
         default=0,
     )
+    quantity_reserved = models.PositiveIntegerField(
+        'В работе',
+        default=0,
+        help_text='Выкупы в процессе, на модерации и на проверке (обновляется автоматически)',
+    )
 
     limit_per_user = models.PositiveIntegerField(
         'Лимит на пользователя',
@@ -96,35 +101,18 @@ class Product(models.Model):
             return f'{self.limit_per_user} раз в сутки'
         return f'{self.limit_per_user} раз за {self.limit_per_user_days} дней'
 
+    @property
+    def quantity_available(self):
+        """Доступно для выкупа — по счётчикам товара, без запросов к выкупам"""
+        return self.quantity_total - self.quantity_completed - self.quantity_reserved
+
     def get_quantity_available(self):
         """Доступно для выкупа (синхронно)"""
-        from pipeline.models import Buyback
-
-        in_progress = Buyback.objects.filter(
-            task__product=self,
-            status__in=[
-                Buyback.Status.IN_PROGRESS,
-                Buyback.Status.ON_MODERATION,
-                Buyback.Status.PENDING_REVIEW,
-            ]
-        ).count()
-
-        return self.quantity_total - self.quantity_completed - in_progress
+        return self.quantity_available
 
     async def aget_quantity_available(self):
         """Доступно для выкупа (асинхронно)"""
-        from pipeline.models import Buyback
-
-        in_progress = await Buyback.objects.filter(
-            task__product=self,
-            status__in=[
-                Buyback.Status.IN_PROGRESS,
-                Buyback.Status.ON_MODERATION,
-                Buyback.Status.PENDING_REVIEW,
-            ]
-        ).acount()
-
-        return self.quantity_total - self.quantity_completed - in_progress
+        return self.quantity_available
 
     async def acheck_user_limit(self, user) -> tuple[bool, str]:
         """Проверка лимита пользователя. Возвращает (can_take, message)"""
@@ -183,6 +171,12 @@ class Task(models.Model):
         'Активно',
         default=True,
     )
+    steps_version = models.PositiveIntegerField(
+        'Версия шагов',
+        default=0,
+        editable=False,
+        help_text='Увеличивается при любом изменении шагов задания',
+    )
     created_at = models.DateTimeField(
         'Дата создания',
         auto_now_add=True,
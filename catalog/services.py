@@ -0,0 +1,24 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from steps.models import TaskStep
+from .models import Task
+
+
+def catalog_queryset():
+    """Задания с товаром, количеством шагов и доступным остатком — одним запросом"""
+    steps_count = Subquery(
+        TaskStep.objects.filter(
+            task=OuterRef('pk'),
+        ).values('task').annotate(total=Count('pk')).values('total')
+    )
+
+    return Task.objects.select_related('product').annotate(
+        steps_count=Coalesce(steps_count, 0),
+        available=(
+            F('product__quantity_total')
+            - F('product__quantity_completed')
+            - F('product__quantity_reserved')
+        ),
+    )
+
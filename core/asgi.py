@@ -14,3 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+# Webhook бота: апдейты Telegram принимаются этим же ASGI-приложением
+if settings.BOT_WEBHOOK_URL:
+    from bot.webhook import TelegramWebhookApp  # noqa: E402
+
+    application = TelegramWebhookApp(application)
@@ -97,6 +97,66 @@ BONUS_BOT_TOKEN = config('BONUS_BOT_TOKEN', default='')
 MANAGER_USERNAME = config('MANAGER_USERNAME', default='manager')
 DOCUMENTS_URL = config('DOCUMENTS_URL', default='https://drive.google.com/drive/folders/135ZcME2o1n4i--OXHn4-3FHM3BfRhN-Z')
 
+# Кэш каталога заданий в процессе бота (секунды)
+BOT_CATALOG_CACHE_TTL = config('BOT_CATALOG_CACHE_TTL', default=60, cast=int)
+
+# Кэш пользователь → активный выкуп → шаг в процессе бота
+BOT_IDENTITY_CACHE_SIZE = config('BOT_IDENTITY_CACHE_SIZE', default=5000, cast=int)
+BOT_IDENTITY_CACHE_TTL = config('BOT_IDENTITY_CACHE_TTL', default=60, cast=int)
+
+# Как часто бот сохраняет user_data и состояния диалогов в БД (секунды)
+BOT_PERSISTENCE_INTERVAL = config('BOT_PERSISTENCE_INTERVAL', default=30, cast=int)
+
+# Webhook: публичный URL эндпоинта (пусто = polling через runbot) и секрет из заголовка Telegram.
+# Бот запускается в lifespan ASGI-приложения — в webhook-режиме только один воркер ASGI-сервера
+BOT_WEBHOOK_URL = config('BOT_WEBHOOK_URL', default='')
+BOT_WEBHOOK_SECRET = config('BOT_WEBHOOK_SECRET', default='')
+# Максимум принятых и ещё не обработанных апдейтов; сверх — 503 (Telegram повторит), polling ждёт
+BOT_UPDATE_QUEUE_SIZE = config('BOT_UPDATE_QUEUE_SIZE', default=1000, cast=int)
+# Сколько апдейтов (разных пользователей) обрабатывается одновременно
+BOT_CONCURRENT_UPDATES = config('BOT_CONCURRENT_UPDATES', default=16, cast=int)
+
+# Планировщик дедлайнов: полная пересинхронизация с БД (отмены и переносы из бэкофиса), секунды
+BOT_SCHEDULER_RESYNC_INTERVAL = config('BOT_SCHEDULER_RESYNC_INTERVAL', default=120, cast=int)
+# Догоняющая проверка новых дедлайнов из бэкофиса: три коротких запроса по частичным индексам, секунды.
+# Дедлайн, созданный вне бота, срабатывает с опозданием не больше этого интервала
+BOT_SCHEDULER_CATCHUP_INTERVAL = config('BOT_SCHEDULER_CATCHUP_INTERVAL', default=5, cast=int)
+
+# Лимиты исходящих запросов бота (Telegram: ~30 сообщений/с всего, 1 сообщение/с в чат)
+BOT_RATE_LIMIT_GLOBAL = config('BOT_RATE_LIMIT_GLOBAL', default=30, cast=float)
+BOT_RATE_LIMIT_PER_CHAT = config('BOT_RATE_LIMIT_PER_CHAT', default=1, cast=float)
+BOT_RATE_LIMIT_CONCURRENCY = config('BOT_RATE_LIMIT_CONCURRENCY', default=8, cast=int)
+BOT_RATE_LIMIT_MAX_RETRIES = config('BOT_RATE_LIMIT_MAX_RETRIES', default=3, cast=int)
+
+# Напоминания захватываются пачками с арендой — можно запускать несколько экземпляров бота
+BOT_REMINDER_BATCH_SIZE = config('BOT_REMINDER_BATCH_SIZE', default=100, cast=int)
+BOT_REMINDER_LEASE_SECONDS = config('BOT_REMINDER_LEASE_SECONDS', default=120, cast=int)
+# Напоминания одному чату в пределах окна (секунды) склеиваются в одно сообщение; 0 — без склейки
+BOT_REMINDER_DIGEST_WINDOW = config('BOT_REMINDER_DIGEST_WINDOW', default=5, cast=float)
+
+# Хранение завершённых напоминаний (дни) и очистка пачками; бот чистит раз в BOT_REMINDER_PRUNE_INTERVAL секунд
+REMINDER_RETENTION_DAYS = config('REMINDER_RETENTION_DAYS', default=30, cast=int)
+REMINDER_PRUNE_CHUNK_SIZE = config('REMINDER_PRUNE_CHUNK_SIZE', default=5000, cast=int)
+BOT_REMINDER_PRUNE_INTERVAL = config('BOT_REMINDER_PRUNE_INTERVAL', default=6 * 3600, cast=int)
+
+# Клиент Bot API вне python-telegram-bot (core.telegram): таймаут запроса и размер пула соединений
+TELEGRAM_API_TIMEOUT = config('TELEGRAM_API_TIMEOUT', default=10, cast=float)
+TELEGRAM_API_POOL_SIZE = config('TELEGRAM_API_POOL_SIZE', default=10, cast=int)
+
+# Outbox: сообщения Telegram из Django (модерация, бонус-чат) отправляет воркер в процессе бота
+BOT_OUTBOX_BATCH_SIZE = config('BOT_OUTBOX_BATCH_SIZE', default=100, cast=int)
+BOT_OUTBOX_POLL_INTERVAL = config('BOT_OUTBOX_POLL_INTERVAL', default=1, cast=float)
+BOT_OUTBOX_LEASE_SECONDS = config('BOT_OUTBOX_LEASE_SECONDS', default=60, cast=int)
+BOT_OUTBOX_MAX_ATTEMPTS = config('BOT_OUTBOX_MAX_ATTEMPTS', default=8, cast=int)
+OUTBOX_RETENTION_DAYS = config('OUTBOX_RETENTION_DAYS', default=7, cast=int)
+
+# Сверка денормализованных счётчиков (товары, пользователи) с выкупами: размер пачки UPDATE и период в боте, секунды
+COUNTER_RECONCILE_CHUNK_SIZE = config('COUNTER_RECONCILE_CHUNK_SIZE', default=1000, cast=int)
+BOT_COUNTER_RECONCILE_INTERVAL = config('BOT_COUNTER_RECONCILE_INTERVAL', default=6 * 3600, cast=int)
+
+# Как часто бот пишет в лог сводку метрик (задачи планировщика, отправки, кэши), секунды
+BOT_METRICS_LOG_INTERVAL = config('BOT_METRICS_LOG_INTERVAL', default=300, cast=int)
+
 
 # Internationalization
 LANGUAGE_CODE = 'ru-ru'
@@ -133,5 +193,9 @@ LOGGING = {
             'handlers': ['console'],
             'level': 'ERROR',
         },
+        'bot': {
+            'handlers': ['console'],
+            'level': config('BOT_LOG_LEVEL', default='INFO'),
+        },
     },
 }
\ No newline at end of file
@@ -0,0 +1,202 @@
+"""Клиент Telegram Bot API для вызовов вне python-telegram-bot.
+
+Один пул keep-alive соединений на токен: асинхронный (httpx.AsyncClient) —
+им outbox бота отправляет сообщения бонус-бота, и синхронный
+(requests.Session) для кода Django, которому нужен ответ Telegram сразу.
+Уведомления пользователям из Django идут через outbox, а не напрямую.
+Ошибки приводятся к TelegramAPIError / TelegramNetworkError, по каждому
+методу считаются вызовы, ошибки и время ответа.
+"""
+import threading
+import time
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+API_URL = 'https://api.telegram.org/bot{token}/{method}'
+
+MAIN = 'main'
+BONUS = 'bonus'
+
+
+def _tokens() -> dict[str, str]:
+    return {
+        MAIN: settings.BOT_TOKEN,
+        BONUS: settings.BONUS_BOT_TOKEN,
+    }
+
+
+class TelegramAPIError(Exception):
+    """Telegram ответил ok=false"""
+
+    def __init__(self, method: str, error_code: int | None, description: str, retry_after: int | None = None):
+        super().__init__(f'{method}: {error_code} {description}')
+        self.method = method
+        self.error_code = error_code
+        self.description = description
+        self.retry_after = retry_after
+
+    @property
+    def permanent(self) -> bool:
+        """Повтор не поможет: некорректный запрос или бот заблокирован"""
+        return self.error_code in (400, 403)
+
+
+class TelegramNetworkError(Exception):
+    """Сетевая ошибка, таймаут или ответ не в JSON (502 прокси) — запрос можно повторить"""
+
+
+class MethodStats:
+    __slots__ = ('calls', 'errors', 'total_seconds', 'max_seconds')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'avg': round(self.total_seconds / self.calls, 3) if self.calls else 0.0,
+            'max': round(self.max_seconds, 3),
+        }
+
+
+class _BaseClient:
+    def __init__(self, name: str, token: str, timeout: float):
+        self.name = name
+        self.token = token
+        self.timeout = timeout
+        self._stats: dict[str, MethodStats] = {}
+
+    def _url(self, method: str) -> str:
+        return API_URL.format(token=self.token, method=method)
+
+    def _record(self, method: str, elapsed: float, ok: bool):
+        stats = self._stats.get(method)
+        if stats is None:
+            stats = self._stats[method] = MethodStats()
+        stats.calls += 1
+        stats.total_seconds += elapsed
+        stats.max_seconds = max(stats.max_seconds, elapsed)
+        if not ok:
+            stats.errors += 1
+
+    @staticmethod
+    def _result(method: str, data: dict):
+        if data.get('ok'):
+            return data.get('result')
+        parameters = data.get('parameters') or {}
+        raise TelegramAPIError(
+            method,
+            data.get('error_code'),
+            data.get('description', 'Unknown error'),
+            retry_after=parameters.get('retry_after'),
+        )
+
+    def stats(self) -> dict:
+        return {method: stats.as_dict() for method, stats in self._stats.items()}
+
+
+class TelegramClient(_BaseClient):
+    """Синхронный клиент (процессы Django)"""
+
+    def __init__(self, name: str, token: str, timeout: float = 10, pool_size: int = 10):
+        super().__init__(name, token, timeout)
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+    def call(self, method: str, **params):
+        started = time.monotonic()
+        ok = False
+        try:
+            response = self.session.post(self._url(method), json=params, timeout=self.timeout)
+            try:
+                data = response.json()
+            except ValueError as e:
+                raise TelegramNetworkError(f'{method}: HTTP {response.status_code}, ответ не JSON') from e
+            result = self._result(method, data)
+            ok = True
+            return result
+        except requests.RequestException as e:
+            raise TelegramNetworkError(f'{method}: {e}') from e
+        finally:
+            self._record(method, time.monotonic() - started, ok)
+
+    def send_message(self, chat_id: int, text: str, **params) -> dict:
+        return self.call('sendMessage', chat_id=chat_id, text=text, **params)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncTelegramClient(_BaseClient):
+    """Асинхронный клиент (процесс бота)"""
+
+    def __init__(self, name: str, token: str, timeout: float = 10, pool_size: int = 10):
+        super().__init__(name, token, timeout)
+        self.http = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def call(self, method: str, **params):
+        started = time.monotonic()
+        ok = False
+        try:
+            response = await self.http.post(self._url(method), json=params)
+            try:
+                data = response.json()
+            except ValueError as e:
+                raise TelegramNetworkError(f'{method}: HTTP {response.status_code}, ответ не JSON') from e
+            result = self._result(method, data)
+            ok = True
+            return result
+        except httpx.HTTPError as e:
+            raise TelegramNetworkError(f'{method}: {e}') from e
+        finally:
+            self._record(method, time.monotonic() - started, ok)
+
+    async def send_message(self, chat_id: int, text: str, **params) -> dict:
+        return await self.call('sendMessage', chat_id=chat_id, text=text, **params)
+
+    async def aclose(self):
+        await self.http.aclose()
+
+
+_clients: dict[str, TelegramClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(bot: str = MAIN) -> TelegramClient:
+    """Общий синхронный клиент бота (один пул соединений на процесс)"""
+    client = _clients.get(bot)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(bot)
+            if client is None:
+                client = _clients[bot] = TelegramClient(
+                    bot,
+                    _tokens()[bot],
+                    timeout=settings.TELEGRAM_API_TIMEOUT,
+                    pool_size=settings.TELEGRAM_API_POOL_SIZE,
+                )
+    return client
+
+
+def create_async_client(bot: str = MAIN) -> AsyncTelegramClient:
+    """Асинхронный клиент; владелец закрывает его через aclose()"""
+    return AsyncTelegramClient(
+        bot,
+        _tokens()[bot],
+        timeout=settings.TELEGRAM_API_TIMEOUT,
+        pool_size=settings.TELEGRAM_API_POOL_SIZE,
+    )
+
+
+def is_configured(bot: str) -> bool:
+    return bool(_tokens().get(bot))
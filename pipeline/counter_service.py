@@ -0,0 +1,129 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from account.models import TelegramUser
+from catalog.models import Product
+from .models import Buyback
+
+
+# Статусы, в которых выкуп занимает единицу товара
+RESERVED_STATUSES = (
+    Buyback.Status.IN_PROGRESS,
+    Buyback.Status.ON_MODERATION,
+    Buyback.Status.PENDING_REVIEW,
+)
+
+
+def is_reserved(status) -> bool:
+    """Занимает ли выкуп в этом статусе единицу товара"""
+    return status in RESERVED_STATUSES
+
+
+def is_completed(status) -> bool:
+    """Засчитывается ли выкуп в выполненные (товар и пользователь)"""
+    return status == Buyback.Status.APPROVED
+
+
+def adjust_reserved(task_id: int, delta: int):
+    """Атомарно изменить счётчик «В работе» у товара задания"""
+    if not delta:
+        return
+    Product.objects.filter(tasks__id=task_id).update(
+        quantity_reserved=Greatest(F('quantity_reserved') + delta, 0),
+    )
+
+
+def adjust_completed(task_id: int, user_id: int, delta: int):
+    """Атомарно изменить счётчики выполненных у товара и пользователя"""
+    if not delta:
+        return
+    Product.objects.filter(tasks__id=task_id).update(
+        quantity_completed=Greatest(F('quantity_completed') + delta, 0),
+    )
+    TelegramUser.objects.filter(pk=user_id).update(
+        total_completed=Greatest(F('total_completed') + delta, 0),
+    )
+
+
+def on_status_transition(task_id: int, user_id: int, old_status, new_status):
+    """Обновить счётчики при переходе выкупа между статусами.
+
+    Единственное место, где меняются quantity_reserved, quantity_completed
+    и total_completed; вызывается из post_save в транзакции сохранения.
+    """
+    adjust_reserved(task_id, int(is_reserved(new_status)) - int(is_reserved(old_status)))
+    adjust_completed(task_id, user_id, int(is_completed(new_status)) - int(is_completed(old_status)))
+
+
+def _count_subquery(group_field: str, **filters):
+    """Число выкупов по группе (GROUP BY group_field) для строки внешнего запроса"""
+    return Coalesce(
+        Subquery(
+            Buyback.objects.filter(
+                **{group_field: OuterRef('pk')},
+                **filters,
+            ).order_by().values(group_field).annotate(total=Count('pk')).values('total')
+        ),
+        0,
+    )
+
+
+def _reconcile(queryset, field: str, actual, chunk_size: int | None = None) -> dict[int, tuple[int, int]]:
+    """Найти расхождение field с actual одним SELECT и исправить его UPDATE'ами пачками.
+
+    При исправлении значение пересчитывается заново в самом UPDATE, поэтому
+    изменения, закоммиченные между поиском и исправлением, не теряются.
+    """
+    drift = {
+        pk: (stored, value)
+        for pk, stored, value in queryset.annotate(
+            actual=actual,
+        ).exclude(
+            **{field: F('actual')},
+        ).values_list('pk', field, 'actual')
+    }
+
+    pks = sorted(drift)
+    chunk_size = chunk_size or len(pks) or 1
+    for start in range(0, len(pks), chunk_size):
+        queryset.model.objects.filter(pk__in=pks[start:start + chunk_size]).update(**{field: actual})
+
+    return drift
+
+
+def reconcile_reserved(product_ids=None, chunk_size: int | None = None) -> dict[int, tuple[int, int]]:
+    """Пересчитать quantity_reserved по выкупам.
+
+    Возвращает {product_id: (было, стало)} для исправленных товаров.
+    """
+    queryset = Product.objects.all()
+    if product_ids is not None:
+        queryset = queryset.filter(pk__in=product_ids)
+
+    return _reconcile(
+        queryset,
+        'quantity_reserved',
+        _count_subquery('task__product', status__in=RESERVED_STATUSES),
+        chunk_size,
+    )
+
+
+def reconcile_completed(chunk_size: int | None = None) -> dict[str, dict[int, tuple[int, int]]]:
+    """Пересчитать quantity_completed товаров и total_completed пользователей по одобренным выкупам.
+
+    Возвращает {'products': {...}, 'users': {...}} в формате {pk: (было, стало)}.
+    """
+    return {
+        'products': _reconcile(
+            Product.objects.all(),
+            'quantity_completed',
+            _count_subquery('task__product', status=Buyback.Status.APPROVED),
+            chunk_size,
+        ),
+        'users': _reconcile(
+            TelegramUser.objects.all(),
+            'total_completed',
+            _count_subquery('user', status=Buyback.Status.APPROVED),
+            chunk_size,
+        ),
+    }
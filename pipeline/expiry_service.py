@@ -0,0 +1,102 @@
+from collections import Counter
+from datetime import datetime
+from typing import NamedTuple
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from account.models import TelegramUser
+from catalog.models import Task
+from .models import Buyback
+from .counter_service import adjust_reserved
+from .lifecycle import finish_buybacks
+
+
+class ExpiredBuyback(NamedTuple):
+    """Выкуп, переведённый в EXPIRED"""
+    id: int
+    task_id: int
+    user_id: int
+    telegram_id: int
+    task_title: str
+    step_started_at: datetime
+    step_deadline_at: datetime
+
+    @property
+    def timeout_minutes(self) -> int:
+        return int((self.step_deadline_at - self.step_started_at).total_seconds() // 60)
+
+
+class DueStepReminder(NamedTuple):
+    """Выкуп, у которого захвачено напоминание по шагу"""
+    id: int
+    current_step: int
+    telegram_id: int
+    task_id: int
+    task_title: str
+    steps_version: int
+    step_remind_at: datetime
+
+
+def claim_due_step_reminders(due_before) -> list[DueStepReminder]:
+    """Захватить все наступившие напоминания по шагам одним UPDATE ... RETURNING.
+
+    Строки выбираются с FOR UPDATE SKIP LOCKED и сразу помечаются
+    (step_remind_at = NULL), так что каждое напоминание достаётся ровно
+    одному экземпляру бота, а current_step возвращается из той же строки —
+    переход на следующий шаг между выборкой и захватом невозможен.
+    step_remind_at в результате — значение до захвата.
+    """
+    qn = connection.ops.quote_name
+    table = qn(Buyback._meta.db_table)
+    sql = (
+        f'UPDATE {table} AS b SET reminder_sent = TRUE, step_remind_at = NULL '
+        f'FROM (SELECT id, step_remind_at FROM {table} '
+        f'WHERE status = %s AND step_remind_at <= %s FOR UPDATE SKIP LOCKED) AS due, '
+        f'{qn(TelegramUser._meta.db_table)} AS u, {qn(Task._meta.db_table)} AS t '
+        f'WHERE b.id = due.id AND b.user_id = u.id AND b.task_id = t.id '
+        f'RETURNING b.id, b.current_step, u.telegram_id, t.id, t.title, t.steps_version, due.step_remind_at'
+    )
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [Buyback.Status.IN_PROGRESS, due_before])
+            return [DueStepReminder(*row) for row in cursor.fetchall()]
+
+
+def expire_overdue_buybacks(now=None, buyback_ids=None) -> list[ExpiredBuyback]:
+    """Перевести все просроченные IN_PROGRESS выкупы в EXPIRED одним UPDATE ... RETURNING.
+
+    Выкуп, уже ушедший из IN_PROGRESS (ответ на модерации, отмена, истечение
+    другим процессом), не попадает в выборку — истекает ровно один раз.
+    post_save не отправляется, поэтому счётчик «В работе» и таймеры
+    выкупов обновляются здесь же, в той же транзакции.
+    """
+    now = now or timezone.now()
+    qn = connection.ops.quote_name
+    sql = (
+        f'UPDATE {qn(Buyback._meta.db_table)} AS b SET status = %s '
+        f'FROM {qn(TelegramUser._meta.db_table)} AS u, {qn(Task._meta.db_table)} AS t '
+        f'WHERE b.user_id = u.id AND b.task_id = t.id '
+        f'AND b.status = %s AND b.step_deadline_at <= %s'
+    )
+    params = [Buyback.Status.EXPIRED, Buyback.Status.IN_PROGRESS, now]
+    if buyback_ids is not None:
+        sql += ' AND b.id = ANY(%s)'
+        params.append(list(buyback_ids))
+    sql += (
+        ' RETURNING b.id, b.task_id, b.user_id, u.telegram_id, t.title,'
+        ' b.step_started_at, b.step_deadline_at'
+    )
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            expired = [ExpiredBuyback(*row) for row in cursor.fetchall()]
+
+        if expired:
+            for task_id, count in Counter(row.task_id for row in expired).items():
+                adjust_reserved(task_id, -count)
+
+            finish_buybacks(row.id for row in expired)
+
+    return expired
@@ -0,0 +1,39 @@
+from django.db import transaction
+from django.dispatch import Signal
+
+from .models import Buyback, ReviewReminder
+
+
+# Статусы, из которых выкуп уже не вернётся в работу
+TERMINAL_STATUSES = (
+    Buyback.Status.APPROVED,
+    Buyback.Status.REJECTED,
+    Buyback.Status.CANCELLED,
+    Buyback.Status.EXPIRED,
+)
+
+# Выкупы перешли в конечный статус (после коммита); kwargs: buyback_ids
+buyback_finished = Signal()
+
+
+def is_terminal(status) -> bool:
+    return status in TERMINAL_STATUSES
+
+
+def finish_buybacks(buyback_ids):
+    """Снять все отложенные таймеры завершённых выкупов.
+
+    Напоминания отменяются одним UPDATE; планировщик бота (если он есть
+    в этом процессе) узнаёт об этом через buyback_finished.
+    """
+    buyback_ids = list(buyback_ids)
+    if not buyback_ids:
+        return
+
+    ReviewReminder.objects.filter(
+        buyback_id__in=buyback_ids,
+        scheduled_at__isnull=False,
+        is_cancelled=False,
+    ).update(is_cancelled=True)
+
+    transaction.on_commit(lambda: buyback_finished.send(sender=Buyback, buyback_ids=buyback_ids))
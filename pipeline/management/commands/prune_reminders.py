@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pipeline.reminder_service import prune_finished_reminders
+
+
+class Command(BaseCommand):
+    help = 'Удаляет завершённые и отменённые напоминания старше срока хранения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.REMINDER_RETENTION_DAYS)
+        parser.add_argument('--chunk-size', type=int, default=settings.REMINDER_PRUNE_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        deleted = prune_finished_reminders(options['days'], options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Готово! Удалено напоминаний: {deleted}'))
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pipeline.counter_service import reconcile_completed, reconcile_reserved
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики товаров и пользователей («В работе», выполнено) по реальным выкупам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=settings.COUNTER_RECONCILE_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        reserved = reconcile_reserved(chunk_size=chunk_size)
+        completed = reconcile_completed(chunk_size=chunk_size)
+
+        for product_id, (stored, actual) in sorted(reserved.items()):
+            self.stdout.write(f'  Товар #{product_id}: в работе {stored} → {actual}')
+        for product_id, (stored, actual) in sorted(completed['products'].items()):
+            self.stdout.write(f'  Товар #{product_id}: выполнено {stored} → {actual}')
+        for user_id, (stored, actual) in sorted(completed['users'].items()):
+            self.stdout.write(f'  Пользователь #{user_id}: выполнено {stored} → {actual}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово! Исправлено товаров: {len(set(reserved) | set(completed["products"]))}, '
+            f'пользователей: {len(completed["users"])}'
+        ))
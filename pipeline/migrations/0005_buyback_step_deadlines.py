@@ -0,0 +1,60 @@
+# Generated by Django 6.0.1 on 2026-10-17 14:05
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    """Compute deadlines for buybacks that are currently in progress."""
+    Buyback = apps.get_model('pipeline', 'Buyback')
+    TaskStep = apps.get_model('steps', 'TaskStep')
+
+    buybacks = list(Buyback.objects.filter(status='in_progress', step_started_at__isnull=False))
+    if not buybacks:
+        return
+
+    steps = {
+        (step.task_id, step.order): step
+        for step in TaskStep.objects.filter(task_id__in={b.task_id for b in buybacks})
+    }
+    for buyback in buybacks:
+        step = steps.get((buyback.task_id, buyback.current_step))
+        if not step:
+            continue
+        if step.timeout_minutes:
+            buyback.step_deadline_at = buyback.step_started_at + timedelta(minutes=step.timeout_minutes)
+        if step.reminder_minutes and not buyback.reminder_sent:
+            buyback.step_remind_at = buyback.step_started_at + timedelta(minutes=step.reminder_minutes)
+
+    Buyback.objects.bulk_update(buybacks, ['step_deadline_at', 'step_remind_at'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pipeline', '0004_custom_publish_at'),
+        ('steps', '0004_taskstep_image_file_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='buyback',
+            name='step_deadline_at',
+            field=models.DateTimeField(blank=True, help_text='step_started_at + таймаут шага (рассчитывается при начале шага)', null=True, verbose_name='Дедлайн шага'),
+        ),
+        migrations.AddField(
+            model_name='buyback',
+            name='step_remind_at',
+            field=models.DateTimeField(blank=True, help_text='Когда отправить напоминание по шагу; сбрасывается после отправки', null=True, verbose_name='Напоминание по шагу'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='buyback',
+            index=models.Index(condition=models.Q(('status', 'in_progress'), ('step_deadline_at__isnull', False)), fields=['step_deadline_at'], name='buyback_step_deadline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='buyback',
+            index=models.Index(condition=models.Q(('status', 'in_progress'), ('step_remind_at__isnull', False)), fields=['step_remind_at'], name='buyback_step_remind_idx'),
+        ),
+    ]
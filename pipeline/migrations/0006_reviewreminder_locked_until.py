@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pipeline', '0005_buyback_step_deadlines'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reviewreminder',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, help_text='Аренда экземпляра бота, обрабатывающего напоминание', null=True, verbose_name='Захвачено до'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 6.0.1 on 2026-10-17 16:40
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+OFFSETS = {
+    'before_3h': -timedelta(hours=3),
+    'before_2h': -timedelta(hours=2),
+    'before_1h': -timedelta(hours=1),
+    'before_5m': -timedelta(minutes=5),
+    'overdue': timedelta(minutes=5),
+}
+
+
+def collapse_reminders(apps, schema_editor):
+    """Merge the per-stage rows of each buyback/step into a single schedule row."""
+    ReviewReminder = apps.get_model('pipeline', 'ReviewReminder')
+
+    groups = {}
+    for reminder in ReviewReminder.objects.select_related('buyback').order_by('scheduled_at', 'id').iterator():
+        groups.setdefault((reminder.buyback_id, reminder.step_id), []).append(reminder)
+
+    keep = []
+    drop = []
+    for rows in groups.values():
+        first = rows[0]
+        if first.buyback.custom_publish_at:
+            publish_at = first.buyback.custom_publish_at
+        elif first.reminder_type == 'overdue':
+            publish_at = first.scheduled_at - OFFSETS['overdue'] - timedelta(hours=2) * first.overdue_count
+        else:
+            publish_at = first.scheduled_at - OFFSETS[first.reminder_type]
+
+        pending = [r for r in rows if r.sent_at is None and not r.is_cancelled]
+        sent = [r.sent_at for r in rows if r.sent_at is not None]
+
+        row = pending[0] if pending else rows[-1]
+        row.publish_at = publish_at
+        row.sent_at = max(sent) if sent else None
+        row.overdue_count = max(r.overdue_count for r in rows)
+        if not pending:
+            row.scheduled_at = None
+        keep.append(row)
+        drop.extend(r.pk for r in rows if r.pk != row.pk)
+
+    ReviewReminder.objects.filter(pk__in=drop).delete()
+    ReviewReminder.objects.bulk_update(keep, ['publish_at', 'sent_at', 'overdue_count', 'scheduled_at'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pipeline', '0006_reviewreminder_locked_until'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reviewreminder',
+            name='publish_at',
+            field=models.DateTimeField(null=True, verbose_name='Время публикации'),
+        ),
+        migrations.AlterField(
+            model_name='reviewreminder',
+            name='scheduled_at',
+            field=models.DateTimeField(blank=True, help_text='Пусто — все напоминания отправлены', null=True, verbose_name='Следующая отправка'),
+        ),
+        migrations.RunPython(collapse_reminders, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='reviewreminder',
+            name='publish_at',
+            field=models.DateTimeField(verbose_name='Время публикации'),
+        ),
+        migrations.AlterField(
+            model_name='reviewreminder',
+            name='reminder_type',
+            field=models.CharField(choices=[('before_3h', 'За 3 часа'), ('before_2h', 'За 2 часа'), ('before_1h', 'За 1 час'), ('before_5m', 'За 5 минут'), ('overdue', 'Просрочено')], max_length=20, verbose_name='Следующее напоминание'),
+        ),
+        migrations.AlterField(
+            model_name='reviewreminder',
+            name='sent_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последняя отправка'),
+        ),
+        migrations.AddConstraint(
+            model_name='reviewreminder',
+            constraint=models.UniqueConstraint(fields=('buyback', 'step'), name='reviewreminder_buyback_step_uniq'),
+        ),
+    ]
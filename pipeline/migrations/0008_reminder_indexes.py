@@ -0,0 +1,21 @@
+# Generated by Django 6.0.1 on 2026-10-17 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pipeline', '0007_reminder_schedule'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reviewreminder',
+            index=models.Index(condition=models.Q(('is_cancelled', False), ('scheduled_at__isnull', False)), fields=['scheduled_at'], name='reminder_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reviewreminder',
+            index=models.Index(condition=models.Q(('is_cancelled', True), ('scheduled_at__isnull', True), _connector='OR'), fields=['created_at'], name='reminder_finished_idx'),
+        ),
+    ]
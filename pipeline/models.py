@@ -1,4 +1,8 @@
-from django.db import models
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import models, router, transaction
+from django.db.models.signals import post_save, pre_save
 from django.utils import timezone
 
 
@@ -64,6 +68,18 @@ class Buyback(models.Model):
         'Напоминание отправлено',
         default=False,
     )
+    step_deadline_at = models.DateTimeField(
+        'Дедлайн шага',
+        null=True,
+        blank=True,
+        help_text='step_started_at + таймаут шага (рассчитывается при начале шага)',
+    )
+    step_remind_at = models.DateTimeField(
+        'Напоминание по шагу',
+        null=True,
+        blank=True,
+        help_text='Когда отправить напоминание по шагу; сбрасывается после отправки',
+    )
 
     started_at = models.DateTimeField(
         'Дата начала',
@@ -79,33 +95,125 @@ class Buyback(models.Model):
         verbose_name = 'Выкуп'
         verbose_name_plural = 'Выкупы'
         ordering = ['-started_at']
+        indexes = [
+            models.Index(
+                fields=['step_deadline_at'],
+                name='buyback_step_deadline_idx',
+                condition=models.Q(status='in_progress', step_deadline_at__isnull=False),
+            ),
+            models.Index(
+                fields=['step_remind_at'],
+                name='buyback_step_remind_idx',
+                condition=models.Q(status='in_progress', step_remind_at__isnull=False),
+            ),
+        ]
+
+    # Поля, которые меняет start_step()
+    STEP_TIMER_FIELDS = ['step_started_at', 'reminder_sent', 'step_deadline_at', 'step_remind_at']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Статус на момент загрузки — для отслеживания переходов без повторного SELECT
+        self._original_status = self.__dict__.get('status')
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'status' not in update_fields:
+            super().save(*args, **kwargs)
+            return
+
+        # Смена статуса и счётчики (post_save) — одной транзакцией
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(type(self), instance=self)):
+            super().save(*args, **kwargs)
+        self._original_status = self.status
 
     def __str__(self):
         return f'{self.task.title} — {self.user}'
 
-    def complete(self):
+    def save_if_status(self, expected, **fields) -> bool:
+        """Записать поля, только если в БД выкуп всё ещё в статусе expected
+        (один статус или несколько допустимых).
+
+        Условный UPDATE закрывает гонку с фоновыми переходами (истечение по
+        таймауту). При успехе в той же транзакции отправляются pre_save
+        и post_save, как при save(update_fields=...), — выплата, счётчики
+        и кэши обновляются тем же путём. Старым статусом считается тот, что
+        был в БД в момент UPDATE, а не снимок в памяти.
+        """
+        using = router.db_for_write(type(self), instance=self)
+        update_fields = frozenset(fields)
+        queryset = type(self).objects.using(using).filter(pk=self.pk)
+        with transaction.atomic(using=using):
+            if isinstance(expected, str):
+                previous = expected
+                updated = queryset.filter(status=expected).update(**fields)
+            else:
+                # Несколько исходных статусов — берём строку под замок, чтобы знать, из какого уходим
+                previous = queryset.filter(status__in=expected).select_for_update().values_list(
+                    'status', flat=True,
+                ).first()
+                updated = previous is not None and queryset.update(**fields)
+            if not updated:
+                return False
+
+            self._original_status = previous
+            for name, value in fields.items():
+                setattr(self, name, value)
+            for signal in (pre_save, post_save):
+                kwargs = {'created': False} if signal is post_save else {}
+                signal.send(
+                    sender=type(self),
+                    instance=self,
+                    update_fields=update_fields,
+                    raw=False,
+                    using=using,
+                    **kwargs,
+                )
+        if 'status' in fields:
+            self._original_status = self.status
+        return True
+
+    async def asave_if_status(self, expected, **fields) -> bool:
+        return await sync_to_async(self.save_if_status)(expected, **fields)
+
+    def start_step(self, step, now=None):
+        """Зафиксировать начало шага и рассчитать его дедлайны (без сохранения)"""
+        now = now or timezone.now()
+        self.step_started_at = now
+        self.reminder_sent = False
+        self.step_deadline_at = now + timedelta(minutes=step.timeout_minutes) if step.timeout_minutes else None
+        self.step_remind_at = now + timedelta(minutes=step.reminder_minutes) if step.reminder_minutes else None
+
+    def is_step_expired(self, now=None) -> bool:
+        """Истёк ли таймаут текущего шага"""
+        return bool(self.step_deadline_at) and (now or timezone.now()) > self.step_deadline_at
+
+    # Из каких статусов допустимы переходы (проверяются условным UPDATE)
+    CANCELLABLE_STATUSES = (Status.IN_PROGRESS, Status.ON_MODERATION)
+    REJECTABLE_STATUSES = (Status.IN_PROGRESS, Status.ON_MODERATION, Status.PENDING_REVIEW)
+
+    def complete(self) -> bool:
         """Завершить выкуп (все шаги пройдены)"""
-        self.status = self.Status.PENDING_REVIEW
-        self.completed_at = timezone.now()
-        self.save(update_fields=['status', 'completed_at'])
+        return self.save_if_status(
+            self.Status.IN_PROGRESS,
+            status=self.Status.PENDING_REVIEW,
+            completed_at=timezone.now(),
+        )
 
-    def approve(self):
-        """Одобрить выкуп"""
-        self.status = self.Status.APPROVED
-        self.save(update_fields=['status'])
+    def approve(self) -> bool:
+        """Одобрить выкуп на проверке (счётчики обновляются в той же транзакции, см. counter_service)"""
+        return self.save_if_status(self.Status.PENDING_REVIEW, status=self.Status.APPROVED)
 
-        # Обновляем счётчики
-        self.task.product.quantity_completed += 1
-        self.task.product.save(update_fields=['quantity_completed'])
+    def reject(self, reason: str = '') -> bool:
+        """Отклонить незавершённый выкуп"""
+        return self.save_if_status(self.REJECTABLE_STATUSES, status=self.Status.REJECTED, rejection_reason=reason)
 
-        self.user.total_completed += 1
-        self.user.save(update_fields=['total_completed'])
+    def cancel(self) -> bool:
+        """Отмена пользователем (только пока выкуп в работе или на модерации ответа)"""
+        return self.save_if_status(self.CANCELLABLE_STATUSES, status=self.Status.CANCELLED)
 
-    def reject(self, reason: str = ''):
-        """Отклонить выкуп"""
-        self.status = self.Status.REJECTED
-        self.rejection_reason = reason
-        self.save(update_fields=['status', 'rejection_reason'])
+    async def acancel(self) -> bool:
+        return await sync_to_async(self.cancel)()
 
 
 class BuybackResponse(models.Model):
@@ -162,7 +270,12 @@ class BuybackResponse(models.Model):
 
 
 class ReviewReminder(models.Model):
-    """Напоминание о публикации отзыва"""
+    """Расписание напоминаний о публикации отзыва (одна строка на выкуп и шаг).
+
+    reminder_type — курсор: следующий этап расписания, scheduled_at — когда
+    его отправить (пусто, когда расписание исчерпано). Время этапов
+    вычисляется из publish_at, см. pipeline.reminder_service.
+    """
 
     class ReminderType(models.TextChoices):
         BEFORE_3H = 'before_3h', 'За 3 часа'
@@ -184,16 +297,22 @@ class ReviewReminder(models.Model):
         verbose_name='Шаг',
     )
 
+    publish_at = models.DateTimeField(
+        'Время публикации',
+    )
     reminder_type = models.CharField(
-        'Тип напоминания',
+        'Следующее напоминание',
         max_length=20,
         choices=ReminderType.choices,
     )
     scheduled_at = models.DateTimeField(
-        'Запланировано на',
+        'Следующая отправка',
+        null=True,
+        blank=True,
+        help_text='Пусто — все напоминания отправлены',
     )
     sent_at = models.DateTimeField(
-        'Отправлено',
+        'Последняя отправка',
         null=True,
         blank=True,
     )
@@ -206,6 +325,12 @@ class ReviewReminder(models.Model):
         default=0,
         help_text='Сколько раз отправлено напоминание о просрочке',
     )
+    locked_until = models.DateTimeField(
+        'Захвачено до',
+        null=True,
+        blank=True,
+        help_text='Аренда экземпляра бота, обрабатывающего напоминание',
+    )
 
     created_at = models.DateTimeField(
         'Создано',
@@ -216,6 +341,23 @@ class ReviewReminder(models.Model):
         verbose_name = 'Напоминание'
         verbose_name_plural = 'Напоминания'
         ordering = ['scheduled_at']
+        constraints = [
+            models.UniqueConstraint(fields=['buyback', 'step'], name='reviewreminder_buyback_step_uniq'),
+        ]
+        indexes = [
+            # Только ожидающие расписания — скан наступивших не растёт с историей
+            models.Index(
+                fields=['scheduled_at'],
+                name='reminder_pending_idx',
+                condition=models.Q(is_cancelled=False, scheduled_at__isnull=False),
+            ),
+            # Завершённые — для очистки по сроку хранения
+            models.Index(
+                fields=['created_at'],
+                name='reminder_finished_idx',
+                condition=models.Q(is_cancelled=True) | models.Q(scheduled_at__isnull=True),
+            ),
+        ]
 
     def __str__(self):
-        return f'{self.buyback} — {self.get_reminder_type_display()}'
\ No newline at end of file
+        return f'{self.buyback} — {self.get_reminder_type_display()}'
@@ -1,4 +1,6 @@
 from datetime import datetime, timedelta, time
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
 from django.conf import settings
 import pytz
@@ -22,10 +24,70 @@ def get_publish_datetime(publish_time: time) -> datetime:
     return publish_dt
 
 
-def create_reminders_for_step(buyback: Buyback, step) -> list[ReviewReminder]:
-    """Создать напоминания для шага публикации отзыва"""
+# Этапы расписания и их смещение от времени публикации
+REMINDER_OFFSETS = {
+    ReviewReminder.ReminderType.BEFORE_3H: -timedelta(hours=3),
+    ReviewReminder.ReminderType.BEFORE_2H: -timedelta(hours=2),
+    ReviewReminder.ReminderType.BEFORE_1H: -timedelta(hours=1),
+    ReviewReminder.ReminderType.BEFORE_5M: -timedelta(minutes=5),
+    ReviewReminder.ReminderType.OVERDUE: timedelta(minutes=5),
+}
+REMINDER_STAGES = list(REMINDER_OFFSETS)
+
+# Повтор напоминания о просрочке и сколько раз его отправлять
+OVERDUE_INTERVAL = timedelta(hours=2)
+OVERDUE_LIMIT = 5
+
+
+def stage_fire_at(publish_at: datetime, stage) -> datetime:
+    """Время отправки этапа (первого напоминания о просрочке для OVERDUE)"""
+    return publish_at + REMINDER_OFFSETS[stage]
+
+
+def first_stage(publish_at: datetime, now: datetime):
+    """Первый ещё не наступивший этап; просрочка — всегда"""
+    for stage in REMINDER_STAGES:
+        if stage == ReviewReminder.ReminderType.OVERDUE or stage_fire_at(publish_at, stage) > now:
+            return stage
+
+
+def due_stage(reminder: ReviewReminder, now: datetime):
+    """Этап для отправки сейчас.
+
+    Если бот пропустил несколько этапов (простой), отправляется только
+    последний наступивший — пропущенные ранние не дублируются.
+    """
+    stage = reminder.reminder_type
+    for candidate in REMINDER_STAGES[REMINDER_STAGES.index(stage) + 1:]:
+        if stage_fire_at(reminder.publish_at, candidate) > now:
+            break
+        stage = candidate
+    return stage
+
+
+def advance_reminder(reminder: ReviewReminder, sent_stage, now: datetime):
+    """Сдвинуть курсор расписания после отправки этапа (без сохранения)"""
+    reminder.sent_at = now
+    reminder.locked_until = None
+
+    if sent_stage == ReviewReminder.ReminderType.OVERDUE:
+        reminder.reminder_type = sent_stage
+        reminder.overdue_count += 1
+        if reminder.overdue_count >= OVERDUE_LIMIT:
+            reminder.scheduled_at = None
+        else:
+            reminder.scheduled_at = now + OVERDUE_INTERVAL
+        return
+
+    next_stage = REMINDER_STAGES[REMINDER_STAGES.index(sent_stage) + 1]
+    reminder.reminder_type = next_stage
+    reminder.scheduled_at = stage_fire_at(reminder.publish_at, next_stage)
+
+
+def create_reminders_for_step(buyback: Buyback, step) -> ReviewReminder | None:
+    """Создать (или перезапустить) расписание напоминаний для шага публикации отзыва"""
     if step.step_type != StepType.PUBLISH_REVIEW:
-        return []
+        return None
 
     # Кастомная дата имеет приоритет над стандартным временем из шага
     if buyback.custom_publish_at:
@@ -33,70 +95,82 @@ def create_reminders_for_step(buyback: Buyback, step) -> list[ReviewReminder]:
     elif step.publish_time:
         publish_dt = get_publish_datetime(step.publish_time)
     else:
-        return []
-    reminders = []
-
-    # За 3 часа
-    scheduled = publish_dt - timedelta(hours=3)
-    if scheduled > timezone.now():
-        reminders.append(ReviewReminder(
-            buyback=buyback,
-            step=step,
-            reminder_type=ReviewReminder.ReminderType.BEFORE_3H,
-            scheduled_at=scheduled,
-        ))
-
-    # За 2 часа
-    scheduled = publish_dt - timedelta(hours=2)
-    if scheduled > timezone.now():
-        reminders.append(ReviewReminder(
-            buyback=buyback,
-            step=step,
-            reminder_type=ReviewReminder.ReminderType.BEFORE_2H,
-            scheduled_at=scheduled,
-        ))
-
-    # За 1 час
-    scheduled = publish_dt - timedelta(hours=1)
-    if scheduled > timezone.now():
-        reminders.append(ReviewReminder(
-            buyback=buyback,
-            step=step,
-            reminder_type=ReviewReminder.ReminderType.BEFORE_1H,
-            scheduled_at=scheduled,
-        ))
-
-    # За 5 минут
-    scheduled = publish_dt - timedelta(minutes=5)
-    if scheduled > timezone.now():
-        reminders.append(ReviewReminder(
-            buyback=buyback,
-            step=step,
-            reminder_type=ReviewReminder.ReminderType.BEFORE_5M,
-            scheduled_at=scheduled,
-        ))
-
-    # Первое напоминание о просрочке (сразу после времени публикации)
-    reminders.append(ReviewReminder(
-        buyback=buyback,
-        step=step,
-        reminder_type=ReviewReminder.ReminderType.OVERDUE,
-        scheduled_at=publish_dt + timedelta(minutes=5),
-    ))
+        return None
 
-    ReviewReminder.objects.bulk_create(reminders)
-    return reminders
+    stage = first_stage(publish_dt, timezone.now())
+    reminder, _ = ReviewReminder.objects.update_or_create(
+        buyback=buyback,
+        step_id=step.id,
+        defaults={
+            'publish_at': publish_dt,
+            'reminder_type': stage,
+            'scheduled_at': stage_fire_at(publish_dt, stage),
+            'sent_at': None,
+            'is_cancelled': False,
+            'overdue_count': 0,
+            'locked_until': None,
+        },
+    )
+    return reminder
 
 
 def cancel_reminders_for_buyback(buyback: Buyback):
     """Отменить все напоминания для выкупа"""
     ReviewReminder.objects.filter(
         buyback=buyback,
-        sent_at__isnull=True,
+        scheduled_at__isnull=False,
         is_cancelled=False,
     ).update(is_cancelled=True)
 
 
+def claim_due_reminders(batch_size: int, lease_seconds: int, now=None, due_before=None) -> list[int]:
+    """Захватить пачку наступивших напоминаний для этого экземпляра бота.
+
+    SELECT ... FOR UPDATE SKIP LOCKED пропускает строки, которые прямо сейчас
+    захватывает другой экземпляр, а аренда locked_until не даёт взять их
+    повторно, пока владелец их обрабатывает. Если экземпляр упал, после
+    истечения аренды напоминания заберёт другой. due_before позволяет взять
+    и напоминания, которые наступят чуть позже (для склейки).
+    """
+    now = now or timezone.now()
+    due_before = due_before or now
+    with transaction.atomic():
+        ids = list(
+            ReviewReminder.objects.filter(
+                Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+                is_cancelled=False,
+                scheduled_at__lte=due_before,
+            ).order_by('scheduled_at').select_for_update(skip_locked=True).values_list('id', flat=True)[:batch_size]
+        )
+        if ids:
+            ReviewReminder.objects.filter(id__in=ids).update(
+                locked_until=now + timedelta(seconds=lease_seconds),
+            )
+    return ids
+
+
+def prune_finished_reminders(older_than_days: int, chunk_size: int = 5000) -> int:
+    """Удалить завершённые и отменённые расписания старше older_than_days.
+
+    Удаляет пачками по chunk_size в отдельных транзакциях, чтобы не держать
+    длинные блокировки. Возвращает число удалённых строк.
+    """
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    finished = ReviewReminder.objects.filter(
+        Q(is_cancelled=True) | Q(scheduled_at__isnull=True),
+        created_at__lt=cutoff,
+    )
+
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(finished.order_by('created_at').values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                return deleted
+            count, _ = ReviewReminder.objects.filter(id__in=ids).delete()
+            deleted += count
+
+
 def get_publish_time_display(buyback: Buyback, step) -> str:
     """Получить отображаемое время публикации (с датой если кастомное)"""
     if buyback.custom_publish_at:
@@ -1,6 +1,7 @@
-from django.conf import settings
-import requests
+from django.db import transaction
 
+from bot.outbox import enqueue_message
+from .models import Buyback, BuybackResponse
 from steps.models import StepType
 
 
@@ -36,21 +37,25 @@ def format_step_message(task, step, total_steps: int, prefix: str = '') -> str:
     return text
 
 
-def send_telegram_message(chat_id: int, text: str, reply_markup: dict = None):
-    """Отправка сообщения в Telegram"""
-    url = f'https://api.telegram.org/bot{settings.BOT_TOKEN}/sendMessage'
+def submit_response(buyback: Buyback, step_id: int, data: dict, status) -> bool:
+    """Сохранить ответ на шаг; ответ на модерацию переводит выкуп в ON_MODERATION.
 
-    data = {
-        'chat_id': chat_id,
-        'text': text,
-        'parse_mode': 'HTML',
-    }
+    Смена статуса и ответ пишутся одной транзакцией. False — выкуп уже не
+    в работе (истёк параллельно), ничего не записано.
+    """
+    with transaction.atomic():
+        if status == BuybackResponse.Status.PENDING:
+            if not buyback.save_if_status(Buyback.Status.IN_PROGRESS, status=Buyback.Status.ON_MODERATION):
+                return False
+        BuybackResponse.objects.create(
+            buyback=buyback,
+            step_id=step_id,
+            response_data=data,
+            status=status,
+        )
+    return True
 
-    if reply_markup:
-        import json
-        data['reply_markup'] = json.dumps(reply_markup)
 
-    try:
-        requests.post(url, data=data, timeout=10)
-    except Exception as e:
-        print(f'Telegram send error: {e}')
\ No newline at end of file
+def send_telegram_message(chat_id: int, text: str, reply_markup: dict = None):
+    """Отправка сообщения в Telegram через outbox (в текущей транзакции)"""
+    enqueue_message(chat_id, text, reply_markup=reply_markup)
@@ -1,11 +1,10 @@
-from django.conf import settings
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from django.utils import timezone
-import requests
 
 from .models import Buyback, BuybackResponse
-from .services import format_step_message
+from .services import format_step_message, send_telegram_message
+from .counter_service import on_status_transition
+from .lifecycle import finish_buybacks, is_terminal
 from .reminder_service import create_reminders_for_step, get_publish_time_display
 from steps.models import StepType
 
@@ -24,10 +23,14 @@ def on_response_moderated(sender, instance, **kwargs):
 
     # Отклонение — возвращаем на текущий шаг
     if instance.status == BuybackResponse.Status.REJECTED:
-        buyback.status = Buyback.Status.IN_PROGRESS
-        buyback.step_started_at = timezone.now()
-        buyback.reminder_sent = False
-        buyback.save(update_fields=['status', 'step_started_at', 'reminder_sent'])
+        buyback.start_step(instance.step)
+        moved = buyback.save_if_status(
+            Buyback.Status.ON_MODERATION,
+            status=Buyback.Status.IN_PROGRESS,
+            **{name: getattr(buyback, name) for name in Buyback.STEP_TIMER_FIELDS},
+        )
+        if not moved:
+            return
 
         text = (
             '❌ <b>Ответ отклонён</b>\n\n'
@@ -47,11 +50,15 @@ def on_response_moderated(sender, instance, **kwargs):
     next_step = buyback.task.steps.filter(order__gt=buyback.current_step).order_by('order').first()
 
     if next_step:
-        buyback.current_step = next_step.order
-        buyback.status = Buyback.Status.IN_PROGRESS
-        buyback.step_started_at = timezone.now()
-        buyback.reminder_sent = False
-        buyback.save(update_fields=['current_step', 'status', 'step_started_at', 'reminder_sent'])
+        buyback.start_step(next_step)
+        moved = buyback.save_if_status(
+            Buyback.Status.ON_MODERATION,
+            current_step=next_step.order,
+            status=Buyback.Status.IN_PROGRESS,
+            **{name: getattr(buyback, name) for name in Buyback.STEP_TIMER_FIELDS},
+        )
+        if not moved:
+            return
 
         total_steps = buyback.task.steps.count()
 
@@ -80,8 +87,8 @@ def on_response_moderated(sender, instance, **kwargs):
                 prefix='✅ <b>Модератор одобрил!</b>\n\n'
             )
     else:
-        buyback.status = Buyback.Status.PENDING_REVIEW
-        buyback.save(update_fields=['status'])
+        if not buyback.save_if_status(Buyback.Status.ON_MODERATION, status=Buyback.Status.PENDING_REVIEW):
+            return
 
         text = (
             '🎉 <b>Все шаги выполнены!</b>\n\n'
@@ -92,29 +99,22 @@ def on_response_moderated(sender, instance, **kwargs):
 
 
 @receiver(pre_save, sender=Buyback)
-def on_buyback_status_change(sender, instance, **kwargs):
-    """При изменении статуса выкупа"""
+def on_buyback_status_change(sender, instance, update_fields=None, **kwargs):
+    """При изменении статуса выкупа (старый статус — снимок с момента загрузки, без SELECT)"""
 
     if not instance.pk:
         return
 
-    try:
-        old_instance = Buyback.objects.get(pk=instance.pk)
-    except Buyback.DoesNotExist:
+    if update_fields is not None and 'status' not in update_fields:
         return
 
-    if old_instance.status != Buyback.Status.APPROVED and instance.status == Buyback.Status.APPROVED:
+    if instance._original_status != Buyback.Status.APPROVED and instance.status == Buyback.Status.APPROVED:
         from payouts.models import Payout
 
+        # Счётчики выполненных обновляет counter_service (post_save)
         if not Payout.objects.filter(buyback=instance).exists():
             Payout.create_from_buyback(instance)
 
-            instance.task.product.quantity_completed += 1
-            instance.task.product.save(update_fields=['quantity_completed'])
-
-            instance.user.total_completed += 1
-            instance.user.save(update_fields=['total_completed'])
-
             text = (
                 '🎉 <b>Выкуп одобрен!</b>\n\n'
                 f'Задание: {instance.task.title}\n'
@@ -124,15 +124,31 @@ def on_buyback_status_change(sender, instance, **kwargs):
             send_telegram_message(instance.user.telegram_id, text)
 
 
-def send_telegram_message(chat_id: int, text: str):
-    """Отправка сообщения в Telegram"""
-    url = f'https://api.telegram.org/bot{settings.BOT_TOKEN}/sendMessage'
+@receiver(post_save, sender=Buyback)
+def on_buyback_saved_update_stock(sender, instance, created, update_fields=None, **kwargs):
+    """Поддерживаем счётчики «В работе» и выполненных у товара и пользователя"""
+    if created:
+        on_status_transition(instance.task_id, instance.user_id, None, instance.status)
+        return
+
+    if update_fields is not None and 'status' not in update_fields:
+        return
+
+    if instance._original_status != instance.status:
+        on_status_transition(instance.task_id, instance.user_id, instance._original_status, instance.status)
+
+
+@receiver(post_save, sender=Buyback)
+def on_buyback_finished(sender, instance, created, update_fields=None, **kwargs):
+    """Конечный статус — снимаем все отложенные таймеры выкупа"""
+    if update_fields is not None and 'status' not in update_fields:
+        return
+
+    if is_terminal(instance.status) and (created or not is_terminal(instance._original_status)):
+        finish_buybacks([instance.pk])
+
 
-    try:
-        requests.post(url, data={
-            'chat_id': chat_id,
-            'text': text,
-            'parse_mode': 'HTML',
-        }, timeout=10)
-    except Exception as e:
-        print(f'Telegram send error: {e}')
\ No newline at end of file
+@receiver(post_delete, sender=Buyback)
+def on_buyback_deleted_update_stock(sender, instance, **kwargs):
+    """Освобождаем товар при удалении активного выкупа (и снимаем выполненный)"""
+    on_status_transition(instance.task_id, instance.user_id, instance._original_status, None)
@@ -1,3 +1,210 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
 
-# Create your tests here.
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TransactionTestCase
+
+from .models import ReviewReminder
+from .reminder_service import (
+    OVERDUE_INTERVAL,
+    OVERDUE_LIMIT,
+    REMINDER_STAGES,
+    advance_reminder,
+    due_stage,
+    first_stage,
+    stage_fire_at,
+)
+
+Stage = ReviewReminder.ReminderType
+PUBLISH_AT = datetime(2026, 10, 17, 12, 0, tzinfo=dt_timezone.utc)
+
+
+def make_reminder(stage, publish_at=PUBLISH_AT, overdue_count=0):
+    return ReviewReminder(
+        publish_at=publish_at,
+        reminder_type=stage,
+        scheduled_at=stage_fire_at(publish_at, stage),
+        overdue_count=overdue_count,
+    )
+
+
+class FirstStageTests(SimpleTestCase):
+    """Выбор первого этапа при создании расписания"""
+
+    def test_all_stages_ahead(self):
+        now = PUBLISH_AT - timedelta(hours=5)
+        self.assertEqual(first_stage(PUBLISH_AT, now), Stage.BEFORE_3H)
+
+    def test_skips_stages_already_passed(self):
+        now = PUBLISH_AT - timedelta(minutes=90)
+        self.assertEqual(first_stage(PUBLISH_AT, now), Stage.BEFORE_1H)
+
+    def test_after_publish_time_is_overdue(self):
+        now = PUBLISH_AT + timedelta(hours=1)
+        self.assertEqual(first_stage(PUBLISH_AT, now), Stage.OVERDUE)
+
+
+class DueStageTests(SimpleTestCase):
+    """Этап к отправке после простоя бота"""
+
+    def test_on_time_sends_cursor_stage(self):
+        reminder = make_reminder(Stage.BEFORE_3H)
+        now = PUBLISH_AT - timedelta(hours=3)
+        self.assertEqual(due_stage(reminder, now), Stage.BEFORE_3H)
+
+    def test_downtime_sends_only_latest_passed_stage(self):
+        reminder = make_reminder(Stage.BEFORE_3H)
+        now = PUBLISH_AT - timedelta(minutes=30)
+        self.assertEqual(due_stage(reminder, now), Stage.BEFORE_1H)
+
+    def test_downtime_past_publish_time_goes_to_overdue(self):
+        reminder = make_reminder(Stage.BEFORE_2H)
+        now = PUBLISH_AT + timedelta(hours=1)
+        self.assertEqual(due_stage(reminder, now), Stage.OVERDUE)
+
+    def test_overdue_stays_overdue(self):
+        reminder = make_reminder(Stage.OVERDUE, overdue_count=2)
+        now = PUBLISH_AT + timedelta(days=1)
+        self.assertEqual(due_stage(reminder, now), Stage.OVERDUE)
+
+    def test_caught_up_reminder_continues_with_next_stage(self):
+        reminder = make_reminder(Stage.BEFORE_3H)
+        now = PUBLISH_AT - timedelta(minutes=30)
+        stage = due_stage(reminder, now)
+        advance_reminder(reminder, stage, now)
+
+        self.assertEqual(reminder.reminder_type, Stage.BEFORE_5M)
+        self.assertEqual(reminder.scheduled_at, PUBLISH_AT - timedelta(minutes=5))
+        self.assertEqual(reminder.sent_at, now)
+
+
+class AdvanceReminderTests(SimpleTestCase):
+    """Сдвиг курсора расписания после отправки"""
+
+    def test_regular_stages_follow_offsets(self):
+        reminder = make_reminder(Stage.BEFORE_3H)
+        for sent, expected in zip(REMINDER_STAGES, REMINDER_STAGES[1:]):
+            now = stage_fire_at(PUBLISH_AT, sent)
+            advance_reminder(reminder, sent, now)
+            self.assertEqual(reminder.reminder_type, expected)
+            self.assertEqual(reminder.scheduled_at, stage_fire_at(PUBLISH_AT, expected))
+        self.assertEqual(reminder.overdue_count, 0)
+
+    def test_overdue_repeats_until_limit(self):
+        reminder = make_reminder(Stage.OVERDUE)
+        now = reminder.scheduled_at
+
+        for count in range(1, OVERDUE_LIMIT):
+            advance_reminder(reminder, Stage.OVERDUE, now)
+            self.assertEqual(reminder.overdue_count, count)
+            self.assertEqual(reminder.scheduled_at, now + OVERDUE_INTERVAL)
+            now = reminder.scheduled_at
+
+        advance_reminder(reminder, Stage.OVERDUE, now)
+        self.assertEqual(reminder.overdue_count, OVERDUE_LIMIT)
+        self.assertIsNone(reminder.scheduled_at)
+        self.assertIsNone(reminder.locked_until)
+
+
+class CollapseRemindersMigrationTests(TransactionTestCase):
+    """0007: строки этапов одного выкупа/шага сворачиваются в одну"""
+
+    migrate_from = ('pipeline', '0006_reviewreminder_locked_until')
+    migrate_to = ('pipeline', '0007_reminder_schedule')
+
+    def _targets(self, node):
+        executor = MigrationExecutor(connection)
+        leaves = [key for key in executor.loader.graph.leaf_nodes() if key[0] != 'pipeline']
+        return [*leaves, node]
+
+    def _migrate(self, node):
+        targets = self._targets(node)
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+    def setUp(self):
+        apps = self._migrate(self.migrate_from)
+        TelegramUser = apps.get_model('account', 'TelegramUser')
+        Product = apps.get_model('catalog', 'Product')
+        Task = apps.get_model('catalog', 'Task')
+        TaskStep = apps.get_model('steps', 'TaskStep')
+        Buyback = apps.get_model('pipeline', 'Buyback')
+        Reminder = apps.get_model('pipeline', 'ReviewReminder')
+
+        user = TelegramUser.objects.create(telegram_id=1)
+        product = Product.objects.create(name='Товар', wb_article='1', price=Decimal('100'))
+        task = Task.objects.create(product=product, title='Задание', payout=Decimal('100'))
+        step = TaskStep.objects.create(task=task, order=1, step_type='publish_review', instruction='-')
+
+        def remind(buyback, stage, sent=False, cancelled=False, overdue_count=0, fire_at=None):
+            fire_at = fire_at or stage_fire_at(PUBLISH_AT, stage)
+            return Reminder.objects.create(
+                buyback=buyback,
+                step=step,
+                reminder_type=stage,
+                scheduled_at=fire_at,
+                sent_at=fire_at if sent else None,
+                is_cancelled=cancelled,
+                overdue_count=overdue_count,
+            )
+
+        # Смешанная группа: два отправлены, один отменён, два ждут
+        self.mixed = Buyback.objects.create(task=task, user=user)
+        remind(self.mixed, Stage.BEFORE_3H, sent=True)
+        remind(self.mixed, Stage.BEFORE_2H, sent=True)
+        remind(self.mixed, Stage.BEFORE_1H, cancelled=True)
+        self.mixed_next = remind(self.mixed, Stage.BEFORE_5M).pk
+        remind(self.mixed, Stage.OVERDUE)
+
+        # Всё отправлено или отменено
+        self.finished = Buyback.objects.create(task=task, user=user)
+        remind(self.finished, Stage.BEFORE_1H, sent=True)
+        remind(self.finished, Stage.BEFORE_5M, sent=True)
+        self.finished_last = remind(self.finished, Stage.OVERDUE, cancelled=True).pk
+
+        # Только просрочка, уже отправленная дважды
+        self.overdue = Buyback.objects.create(task=task, user=user)
+        remind(
+            self.overdue,
+            Stage.OVERDUE,
+            overdue_count=2,
+            fire_at=stage_fire_at(PUBLISH_AT, Stage.OVERDUE) + 2 * OVERDUE_INTERVAL,
+        )
+
+        self.apps = self._migrate(self.migrate_to)
+
+    def tearDown(self):
+        self._migrate(MigrationExecutor(connection).loader.graph.leaf_nodes('pipeline')[0])
+
+    def test_mixed_group_keeps_first_pending_row(self):
+        Reminder = self.apps.get_model('pipeline', 'ReviewReminder')
+        rows = list(Reminder.objects.filter(buyback_id=self.mixed.pk))
+
+        self.assertEqual(len(rows), 1)
+        row = rows[0]
+        self.assertEqual(row.pk, self.mixed_next)
+        self.assertEqual(row.reminder_type, Stage.BEFORE_5M)
+        self.assertEqual(row.publish_at, PUBLISH_AT)
+        self.assertEqual(row.scheduled_at, stage_fire_at(PUBLISH_AT, Stage.BEFORE_5M))
+        self.assertEqual(row.sent_at, stage_fire_at(PUBLISH_AT, Stage.BEFORE_2H))
+        self.assertEqual(row.overdue_count, 0)
+
+    def test_finished_group_is_unscheduled(self):
+        Reminder = self.apps.get_model('pipeline', 'ReviewReminder')
+        row = Reminder.objects.get(buyback_id=self.finished.pk)
+
+        self.assertEqual(row.pk, self.finished_last)
+        self.assertIsNone(row.scheduled_at)
+        self.assertEqual(row.publish_at, PUBLISH_AT)
+        self.assertEqual(row.sent_at, stage_fire_at(PUBLISH_AT, Stage.BEFORE_5M))
+
+    def test_overdue_publish_time_is_rebuilt_from_count(self):
+        Reminder = self.apps.get_model('pipeline', 'ReviewReminder')
+        row = Reminder.objects.get(buyback_id=self.overdue.pk)
+
+        self.assertEqual(row.publish_at, PUBLISH_AT)
+        self.assertEqual(row.overdue_count, 2)
+        self.assertIsNotNone(row.scheduled_at)
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('steps', '0003_steptemplate_steptemplateitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskstep',
+            name='image_file_id',
+            field=models.CharField(blank=True, editable=False, help_text='Заполняется после первой отправки, сбрасывается при замене картинки', max_length=255, verbose_name='Telegram file_id изображения'),
+        ),
+    ]
@@ -47,6 +47,13 @@ class TaskStep(models.Model):
         blank=True,
         help_text='Картинка-инструкция для шага',
     )
+    image_file_id = models.CharField(
+        'Telegram file_id изображения',
+        max_length=255,
+        blank=True,
+        editable=False,
+        help_text='Заполняется после первой отправки, сбрасывается при замене картинки',
+    )
     settings = models.JSONField(
         'Настройки',
         default=dict,
@@ -97,6 +104,12 @@ class TaskStep(models.Model):
         self._original_image = self.image.name if self.image else None
 
     def save(self, *args, **kwargs):
+        if (self.image.name if self.image else None) != self._original_image:
+            # Картинка заменена — старый file_id в Telegram больше не подходит
+            self.image_file_id = ''
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'image' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'image_file_id'}
         if self.image and self.image.name != self._original_image:
             from core.image_utils import compress_image
             new_image = compress_image(self.image)
@@ -108,6 +121,19 @@ class TaskStep(models.Model):
     def __str__(self):
         return f'{self.task.title} — Шаг {self.order}'
 
+    # Разобранные settings (те же поля есть у скомпилированного шага бота)
+    @property
+    def choices(self) -> tuple[str, ...]:
+        return tuple(str(choice) for choice in (self.settings or {}).get('choices', ()))
+
+    @property
+    def correct_article(self) -> str:
+        return str((self.settings or {}).get('correct_article') or '')
+
+    @property
+    def min_length(self) -> int:
+        return int((self.settings or {}).get('min_length', 10) or 0)
+
 
 class StepTemplate(models.Model):
     """Шаблон шагов задания"""
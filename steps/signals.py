@@ -0,0 +1,13 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from catalog.models import Task
+from .models import TaskStep
+
+
+@receiver(post_save, sender=TaskStep)
+@receiver(post_delete, sender=TaskStep)
+def bump_task_steps_version(sender, instance, **kwargs):
+    """Любая правка шагов меняет версию плана задания"""
+    Task.objects.filter(pk=instance.task_id).update(steps_version=F('steps_version') + 1)
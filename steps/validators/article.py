@@ -10,7 +10,7 @@ class ArticleCheckValidator(BaseValidator):
 
         # Берём артикул из настроек шага или из товара
         correct_article = (
-            self.step.settings.get('correct_article') 
+            self.step.correct_article
             or self.buyback.task.product.wb_article
         )
 
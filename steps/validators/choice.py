@@ -7,7 +7,7 @@ class ChoiceValidator(BaseValidator):
 
     async def validate(self, user_input: Any) -> ValidationResult:
         choice = str(user_input).strip()
-        choices = self.step.settings.get('choices', [])
+        choices = self.step.choices
 
         if choices and choice not in choices:
             return ValidationResult(
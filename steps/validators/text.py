@@ -8,7 +8,7 @@ class TextModeratedValidator(BaseValidator):
     async def validate(self, user_input: Any) -> ValidationResult:
         text = str(user_input).strip()
 
-        min_length = self.step.settings.get('min_length', 10)
+        min_length = self.step.min_length
 
         if len(text) < min_length:
             return ValidationResult(